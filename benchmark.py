@@ -0,0 +1,255 @@
+from typing import Dict, Iterable, List, Tuple, Union
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from json import dump, load
+from os import chdir, cpu_count, makedirs
+from os.path import exists
+from platform import platform, python_version
+from resource import RUSAGE_CHILDREN, RUSAGE_SELF, getrusage
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from numpy import ndarray, prod, random, shape, __version__ as numpy_version
+
+from cellular_automata import ElementaryCellularAutomata
+from metrics import METRICS, bdm
+from metrics.lossless_fourier_compression_metric import lossless_fourier_compression
+
+Rule = Union[int,str]
+"""an ECA rule number, or "random" for uniformly random cells"""
+
+RULES:Tuple[Rule,...] = (0,30,90,110,"random")
+SIZES:Tuple[int,...] = (32,64,128,256,512,1024)
+MAXIMUM_SIZES = dict(LosslessFourierCompression=128)
+"""largest lattice each metric is benchmarked at (the exhaustive Fourier search needs ωT inverse transforms)"""
+
+class FFTCounter:
+    """
+    counts the scipy.fft calls made by LosslessFourierCompression while active,
+    and the 2D transforms they compute (a stacked call transforms several images)
+    """
+    FUNCTIONS = ("fft2","ifft2","rfft2","irfft2")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.transforms = 0
+
+    def __enter__(self) -> "FFTCounter":
+        self.originals = dict(
+            (name,getattr(lossless_fourier_compression,name))
+            for name in self.FUNCTIONS
+        )
+        for name,function in self.originals.items():
+            setattr(lossless_fourier_compression,name,self.counted(function))
+        return self
+
+    def __exit__(self, *exception) -> None:
+        for name,function in self.originals.items():
+            setattr(lossless_fourier_compression,name,function)
+
+    def counted(self, function:callable) -> callable:
+        def counted_function(x:ndarray, *args, **kwargs) -> ndarray:
+            self.calls += 1
+            self.transforms += int(prod(shape(x)[:-2]))
+            return function(x, *args, **kwargs)
+        return counted_function
+
+def peak_rss() -> float:
+    """peak resident set size (MiB) of this process or of its largest finished child"""
+    return max(
+        getrusage(RUSAGE_SELF).ru_maxrss,
+        getrusage(RUSAGE_CHILDREN).ru_maxrss
+    )/1024
+
+def benchmark_spacetime(rule:Rule, size:int, seed:int=0, transient_time:int=10) -> ndarray:
+    """
+    reproducible size×size spacetime: the rule evolved from a seeded random
+    initial condition (after a transient), or seeded random cells
+    """
+    generator = random.default_rng(seed)
+    if rule == "random":
+        return generator.integers(0,2,size=(size,size))
+    initial_condition = int("".join(map(str,generator.integers(0,2,size=size))),2)
+    return ElementaryCellularAutomata.evolve(
+        rules=[rule],
+        initial_conditions=[initial_condition],
+        width=size,
+        depth=transient_time+size-1
+    )[0,0,transient_time:].astype(int)
+
+def clear_caches() -> None:
+    """forget every memoised result, so a repeat measures the metric rather than a memo hit"""
+    bdm.histograms.clear()
+
+def benchmark_metric(metric_name:str, size:int, rules:Tuple[Rule,...], repeats:int, seed:int) -> Dict[str,dict]:
+    """
+    time a metric on each rule's spacetime at one size (in a fresh worker process):
+    every repeat measures a fresh copy with the caches cleared, and the first call
+    (which also loads tables such as BDM's CTM values) is recorded separately
+    """
+    results = dict()
+    for rule in rules:
+        spacetime_evolution = benchmark_spacetime(rule=rule,size=size,seed=seed)
+        wall_times = list()
+        for _ in range(repeats):
+            image = spacetime_evolution.copy()
+            clear_caches()
+            with FFTCounter() as fft_counter:
+                start = perf_counter()
+                METRICS[metric_name](image)
+                wall_times.append(perf_counter()-start)
+        results[f"{metric_name}/{size}x{size}/rule{rule}"] = dict(
+            wall_time=min(wall_times),
+            first_wall_time=wall_times[0],
+            wall_times=wall_times,
+            fft_calls=fft_counter.calls,
+            fft_transforms=fft_counter.transforms,
+        )
+    for result in results.values():
+        result["peak_rss_mb"] = peak_rss()
+    return results
+
+def benchmark_stages(size:int, metric_names:Tuple[str,...], initial_condition:int=8932, transient_time:int=10) -> Dict[str,dict]:
+    """
+    time generate_data, measure_dataset and QualityEvaluations one after the other
+    on a size×size dataset in a scratch directory (in a fresh worker process):
+    peak RSS is the high-water mark once each stage is done, and measure_dataset's
+    FFTs run in its own worker processes so are not counted
+    """
+    from generate_data import generate
+    from measure_complexity import measure_dataset
+    from quality_evaluations import QualityEvaluations
+
+    stages = dict(
+        generate_data=lambda:generate(
+            path="data",
+            width=size,
+            depth=size+transient_time-1,
+            initial_condition=initial_condition,
+            transient_time=transient_time
+        ),
+        measure_dataset=lambda:measure_dataset(
+            data_path="data",
+            complexity_metrics=dict((metric_name,METRICS[metric_name]) for metric_name in metric_names)
+        ),
+        QualityEvaluations=lambda:QualityEvaluations(results_path="results").run_all(),
+    )
+    results = dict()
+    with TemporaryDirectory() as scratch_path:
+        chdir(scratch_path)
+        makedirs("data")
+        makedirs("results")
+        for stage,run_stage in stages.items():
+            with FFTCounter() as fft_counter:
+                start = perf_counter()
+                run_stage()
+                wall_time = perf_counter()-start
+            results[f"{stage}/{size}x{size}"] = dict(
+                wall_time=wall_time,
+                first_wall_time=wall_time,
+                wall_times=[wall_time],
+                fft_calls=None if stage == "measure_dataset" else fft_counter.calls,
+                fft_transforms=None if stage == "measure_dataset" else fft_counter.transforms,
+                peak_rss_mb=peak_rss(),
+            )
+    return results
+
+def run(
+    metric_names:Iterable[str]=tuple(METRICS),
+    rules:Iterable[Rule]=RULES,
+    sizes:Iterable[int]=SIZES,
+    maximum_sizes:Dict[str,int]=MAXIMUM_SIZES,
+    stage_sizes:Iterable[int]=(32,),
+    repeats:int=3,
+    seed:int=0
+) -> dict:
+    """
+    every metric at every size (up to its maximum size) on each rule's spacetime,
+    then the pipeline stages on a generated dataset at each stage size:
+    each (metric, size) and each stage size runs alone in a fresh process,
+    so its peak RSS is its own and the timings do not compete
+    """
+    rules = tuple(rules)
+    metric_names = tuple(metric_names)
+    results = dict()
+    with ProcessPoolExecutor(max_workers=1,max_tasks_per_child=1) as processes:
+        for metric_name in metric_names:
+            for size in sizes:
+                if size > maximum_sizes.get(metric_name,size):
+                    continue
+                results.update(processes.submit(
+                    benchmark_metric,metric_name,size,rules,repeats,seed
+                ).result())
+                print(f"{metric_name} {size}x{size}: " + ", ".join(
+                    f"rule {rule} {results[f'{metric_name}/{size}x{size}/rule{rule}']['wall_time']:.4f}s"
+                    for rule in rules
+                ))
+        for size in stage_sizes:
+            stage_results = processes.submit(benchmark_stages,size,metric_names).result()
+            results.update(stage_results)
+            for key,result in stage_results.items():
+                print(f"{key}: {result['wall_time']:.2f}s")
+    return dict(
+        environment=dict(
+            platform=platform(),
+            python=python_version(),
+            numpy=numpy_version,
+            cpu_count=cpu_count(),
+            repeats=repeats,
+            seed=seed,
+        ),
+        benchmarks=results
+    )
+
+def regressions(results:dict, baseline:dict, threshold:float=10.0, minimum_wall_time:float=1e-3) -> List[str]:
+    """
+    every wall time (fastest or first call), peak RSS or FFT count that grew by more than threshold
+    percent over the baseline (benchmarks missing from either side are skipped,
+    as are wall times that grew by less than minimum_wall_time seconds, which is timer noise)
+    """
+    flagged = list()
+    for key,result in results["benchmarks"].items():
+        if key not in baseline["benchmarks"]:
+            continue
+        for measure in ("wall_time","first_wall_time","peak_rss_mb","fft_calls","fft_transforms"):
+            value = result.get(measure)
+            reference = baseline["benchmarks"][key].get(measure)
+            if value is None or reference is None:
+                continue
+            if measure in ("wall_time","first_wall_time") and value-reference < minimum_wall_time:
+                continue
+            if value > reference*(1+threshold/100):
+                change = f"+{100*(value/reference-1):.1f}%" if reference else "from 0"
+                flagged.append(f"{key} {measure}: {reference:.4g} -> {value:.4g} ({change})")
+    return flagged
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="benchmark every metric across lattice sizes and flag regressions against a baseline")
+    parser.add_argument("--metrics",nargs="+",default=list(METRICS),choices=list(METRICS),help="metrics to benchmark")
+    parser.add_argument("--sizes",nargs="+",type=int,default=list(SIZES),help="lattice sizes (size×size spacetimes)")
+    parser.add_argument("--stage-sizes",nargs="*",type=int,default=[32],help="dataset sizes to benchmark the pipeline stages at")
+    parser.add_argument("--repeats",type=int,default=3,help="timings per benchmark (the fastest and the first are compared)")
+    parser.add_argument("--threshold",type=float,default=10.0,help="percentage increase flagged as a regression")
+    parser.add_argument("--minimum-wall-time",type=float,default=1e-3,help="smallest wall time increase (seconds) flagged as a regression")
+    parser.add_argument("--baseline",default="results/benchmark_baseline.json",help="benchmark results to compare against")
+    parser.add_argument("--save-baseline",action="store_true",help="store these results as the baseline")
+    arguments = parser.parse_args()
+
+    makedirs("results", exist_ok=True)
+    results = run(
+        metric_names=arguments.metrics,
+        sizes=arguments.sizes,
+        stage_sizes=arguments.stage_sizes,
+        repeats=arguments.repeats
+    )
+    with open("results/benchmark.json","w") as results_file:
+        dump(results, results_file, indent = 3)
+    if arguments.save_baseline:
+        with open(arguments.baseline,"w") as baseline_file:
+            dump(results, baseline_file, indent = 3)
+    elif exists(arguments.baseline):
+        with open(arguments.baseline) as baseline_file:
+            flagged = regressions(results=results,baseline=load(baseline_file),threshold=arguments.threshold,minimum_wall_time=arguments.minimum_wall_time)
+        for regression in flagged:
+            print(f"regression: {regression}")
+        if flagged:
+            raise SystemExit(1)
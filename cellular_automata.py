@@ -0,0 +1,169 @@
+from itertools import count, product
+from typing import Iterable, Iterator, Optional, Tuple
+from numpy import ndarray, arange, array, empty, frombuffer, roll, stack, unpackbits, uint8, uint64, zeros
+
+class ElementaryCellularAutomata:
+    """
+    every requested rule evolved from every initial condition at once on a periodic lattice,
+    with the eca package's conventions: an initial condition index is read as a binary string
+    (most significant bit leftmost) and the neighbourhood (left,centre,right) of a cell
+    selects bit 4*left+2*centre+right of the rule number
+    """
+    @staticmethod
+    def evolve(
+        rules:Iterable[int],
+        initial_conditions:Iterable[int],
+        width:int,
+        depth:int,
+        bitsliced:bool=False
+    ) -> ndarray:
+        """(rules,initial conditions,depth+1,width) spacetimes, the initial configuration first"""
+        rules = array(list(rules),dtype=int)
+        configurations = ElementaryCellularAutomata.initial_configurations(
+            initial_conditions=initial_conditions,width=width
+        )
+        if bitsliced:
+            return ElementaryCellularAutomata.evolve_bitsliced(
+                rules=rules,configurations=configurations,depth=depth
+            )
+        return ElementaryCellularAutomata.evolve_lookup(
+            rules=rules,configurations=configurations,depth=depth
+        )
+
+    @staticmethod
+    def rows(rule:int, initial_condition:int, width:int, depth:Optional[int]=None) -> Iterator[ndarray]:
+        """
+        one rule's configurations from one initial condition, one at a time
+        (the initial configuration first, then depth steps or forever),
+        so long evolutions can be consumed without holding their spacetime
+        """
+        lookup_table = ElementaryCellularAutomata.lookup_tables(rules=array([rule])).reshape(-1)
+        configuration = ElementaryCellularAutomata.initial_configurations(
+            initial_conditions=[initial_condition],width=width
+        )[0]
+        yield configuration
+        for _ in (count() if depth is None else range(depth)):
+            configuration = lookup_table[
+                (roll(configuration,1) << 2) | (configuration << 1) | roll(configuration,-1)
+            ]
+            yield configuration
+
+    @staticmethod
+    def evolve_lookup(rules:ndarray, configurations:ndarray, depth:int) -> ndarray:
+        """each cell's neighbourhood index looked up in its rule's 8-entry table"""
+        n_configurations,width = configurations.shape
+        lookup_table = ElementaryCellularAutomata.lookup_tables(rules=rules).reshape(-1)
+        rule_offsets = (8*arange(rules.size))[:,None,None]
+        spacetimes = empty((rules.size,n_configurations,depth+1,width),dtype=uint8)
+        spacetimes[:,:,0] = configurations
+        for t in range(depth):
+            configuration = spacetimes[:,:,t]
+            neighbourhoods = (
+                roll(configuration,1,axis=-1) << 2
+            ) | (configuration << 1) | roll(configuration,-1,axis=-1)
+            spacetimes[:,:,t+1] = lookup_table[rule_offsets+neighbourhoods]
+        return spacetimes
+
+    @staticmethod
+    def evolve_bitsliced(rules:ndarray, configurations:ndarray, depth:int) -> ndarray:
+        """
+        each cell of the lattice held as uint64 words whose bit k is that cell's state
+        under rule k of the word (64 rules per word), stepped as the sum of the
+        neighbourhood minterms each rule maps to 1
+        """
+        n_configurations,width = configurations.shape
+        n_words = -(-rules.size//64)
+        rule_masks = ElementaryCellularAutomata.rule_masks(rules=rules,n_words=n_words)
+        ones = ~uint64(0)
+        states = empty((depth+1,n_configurations,width,n_words),dtype=uint64)
+        states[0] = configurations[:,:,None].astype(uint64)*ones
+        for t in range(depth):
+            c = states[t]
+            l = roll(c,1,axis=1)
+            r = roll(c,-1,axis=1)
+            next_state = zeros(c.shape,dtype=uint64)
+            for neighbourhood in range(8):
+                minterm = (l if neighbourhood & 4 else ~l) & (
+                    c if neighbourhood & 2 else ~c
+                ) & (r if neighbourhood & 1 else ~r)
+                next_state |= minterm & rule_masks[neighbourhood]
+            states[t+1] = next_state
+        cells = unpackbits(
+            states.astype("<u8").view(uint8),axis=-1,bitorder="little"
+        )[...,:rules.size]
+        return cells.transpose((3,1,0,2))
+
+    @staticmethod
+    def initial_configurations(initial_conditions:Iterable[int], width:int) -> ndarray:
+        """(initial conditions,width) cells of each initial condition index"""
+        initial_conditions = list(initial_conditions)
+        assert all(0 <= ic < 2**width for ic in initial_conditions), "initial conditions must fit the lattice width"
+        return stack([
+            frombuffer(format(ic,f"0{width}b").encode(),dtype=uint8)-ord("0")
+            for ic in initial_conditions
+        ]).astype(uint8)
+
+    @staticmethod
+    def lookup_tables(rules:ndarray) -> ndarray:
+        """(rules,8) next state of each neighbourhood index 4*left+2*centre+right"""
+        assert ((0 <= rules) & (rules < 256)).all(), "rules must be between 0 and 255"
+        return ((rules[:,None] >> arange(8)) & 1).astype(uint8)
+
+    @staticmethod
+    def rule_masks(rules:ndarray, n_words:int) -> ndarray:
+        """(8,words) bit k of word w set when rule 64w+k maps the neighbourhood to 1"""
+        lookup_tables = zeros((n_words*64,8),dtype=uint64)
+        lookup_tables[:rules.size] = ElementaryCellularAutomata.lookup_tables(rules=rules)
+        lanes = (lookup_tables.reshape((n_words,64,8)) << arange(64,dtype=uint64)[:,None])
+        return lanes.sum(axis=1,dtype=uint64).T
+
+    @staticmethod
+    def mirror_rule(rule:int) -> int:
+        """the rule with left and right neighbours swapped (its spacetimes reflected left-right)"""
+        return sum(
+            ((rule >> (4*left+2*centre+right)) & 1) << (4*right+2*centre+left)
+            for left,centre,right in product((0,1),repeat=3)
+        )
+
+    @staticmethod
+    def complement_rule(rule:int) -> int:
+        """the rule with 0 and 1 swapped (its spacetimes inverted)"""
+        return sum(
+            (1-((rule >> (7-neighbourhood)) & 1)) << neighbourhood
+            for neighbourhood in range(8)
+        )
+
+    @staticmethod
+    def mirror_initial_condition(initial_condition:int, width:int) -> int:
+        """the initial condition reflected left-right"""
+        return int(format(initial_condition,f"0{width}b")[::-1],2)
+
+    @staticmethod
+    def complement_initial_condition(initial_condition:int, width:int) -> int:
+        """the initial condition with 0 and 1 swapped"""
+        return initial_condition ^ (2**width-1)
+
+    @staticmethod
+    def representative(rule:int) -> Tuple[int,bool,bool]:
+        """
+        (smallest rule of the rule's class, mirrored, complemented): the rule's
+        spacetime from an initial condition is the representative's spacetime from
+        the mirrored and/or complemented initial condition, mirrored and/or complemented
+        """
+        smallest = min(ElementaryCellularAutomata.equivalence_class(rule))
+        for mirrored,complemented in product((False,True),repeat=2):
+            representative = ElementaryCellularAutomata.mirror_rule(rule) if mirrored else rule
+            representative = ElementaryCellularAutomata.complement_rule(representative) if complemented else representative
+            if representative == smallest:
+                return representative,mirrored,complemented
+
+    @staticmethod
+    def equivalence_class(rule:int) -> Tuple[int,...]:
+        """the rule's class under mirroring and complementing (one of the 88 classes)"""
+        mirror = ElementaryCellularAutomata.mirror_rule(rule)
+        return tuple(sorted({
+            rule,
+            mirror,
+            ElementaryCellularAutomata.complement_rule(rule),
+            ElementaryCellularAutomata.complement_rule(mirror)
+        }))
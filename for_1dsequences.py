@@ -1,21 +1,22 @@
 #-----------------------FOR BINARY SEQUENCES----
 
+from typing import Callable, Optional, Tuple
 from scipy.fft import fft, ifft
-from numpy import array, count_nonzero, flatnonzero, zeros, ones, inf
+from numpy import arange, array, asarray, cos, count_nonzero, empty, full, load, memmap, multiply, ndarray, pi, remainder, sin, zeros
 
 class 𝝋:
     def __init__(self, mask:list[int]) -> None:
         self.m = mask
-    
+
     def __hash__(self) -> str:
         return hash(str(self))
 
     def __eq__(self, other:"𝝋") -> bool:
         return str(self) == str(other)
-    
+
     def __repr__(self) -> str:
         return str(self.m)
-    
+
     def __call__(self, z:list[complex]) -> list[complex]:
         return z*self.m
 
@@ -25,93 +26,165 @@ def Q(r:list[float],θ:float) -> list[int]:
     return array(r>=θ,dtype=int)
 
 def inverse_C(z_hat:list[complex], θ:float) -> list[int]:
-    """lossless decompression"""
-    r_hat = ifft(z_hat).real
+    """lossless decompression (of each sequence, over the last axis)"""
+    r_hat = ifft(z_hat,axis=-1).real
     return Q(r=r_hat,θ=θ)
 
 def ɛ(s:list[int],s_hat:list[int]) -> float:
-    """reconstruction loss"""
-    return abs(s - s_hat).sum()
+    """reconstruction loss (per sequence for a batch)"""
+    return abs(asarray(s) - s_hat).sum(axis=-1)
 
 
-def 𝝋_prime_search(s:list[int], θ:float) -> 𝝋:
+def optimal_lossless_filters(
+    S:ndarray,
+    θ:float,
+    z:Optional[ndarray]=None,
+    resync_interval:int=64,
+    tolerance:float=1e-9
+) -> ndarray:
+    """
+    (n_sequences,T) masks of the near-optimal lossless filters of a batch of
+    binary sequences, searched together: in each step every sequence's next
+    smallest coefficient is filtered and its basis wave subtracted from the
+    sequence's running reconstruction in O(T) (a sequence is transformed back
+    in full every resync_interval steps, or when one of its samples lies within
+    tolerance of θ, so the quantised reconstructions, and so the filters,
+    are those of filtering and inverting one coefficient at a time)
+    """
+    S = asarray(S)
+    B,T = S.shape
+    z = fft(S,axis=-1) if z is None else z
+    order = (abs(z.real)+abs(z.imag)).argsort(axis=-1)
+    sequences = arange(B)
+    n = arange(T)
+    cosines,sines = cos(2*pi*n/T),sin(2*pi*n/T)
+    phases = empty((B,T),dtype=int)
+    s = S != 0
+
+    z_hat = z.copy()
+    r_hat = ifft(z_hat,axis=-1).real
+    steps_since_resync = zeros(B,dtype=int)
+    last_lossless = full(B,-1)
+    for step in range(T):
+        k = order[:,step]
+        coefficients = z_hat[sequences,k]
+        z_hat[sequences,k] = 0
+        multiply(k[:,None],n,out=phases)
+        remainder(phases,T,out=phases)
+        r_hat -= (coefficients.real[:,None]*cosines[phases]-coefficients.imag[:,None]*sines[phases])/T
+        steps_since_resync += 1
+        resync = (steps_since_resync >= resync_interval) | (abs(r_hat-θ).min(axis=-1) <= tolerance)
+        if resync.any():
+            r_hat[resync] = ifft(z_hat[resync],axis=-1).real
+            steps_since_resync[resync] = 0
+        last_lossless[~((r_hat >= θ) != s).any(axis=-1)] = step
+
+    rank = empty((B,T),dtype=int)
+    rank[sequences[:,None],order] = n
+    masks = (rank > last_lossless[:,None]) & (z != 0)
+    masks[last_lossless < 0] = True
+    return masks
+
+
+def 𝝋_prime_search(s:list[int], θ:float, z:Optional[ndarray]=None) -> 𝝋:
     """
     search for near-optimal lossless filter
     by filtering coefficients in order of magnitude
     (from least influential to most)
     """
-    losses = list()
-    T=len(s)
-    z_hat = fft(s)
-    m = ones(T)
-
-    for index_larger_coefficient in (
-        abs(z_hat.real)+abs(z_hat.imag)        
-    ).argsort():
-        z_hat[index_larger_coefficient]=0
-        loss = ɛ(
-            s=s, 
-            s_hat=inverse_C(
-                z_hat=z_hat, 
-                θ=θ
-            )
-        ) 
-        losses.append(loss)
-        if not loss:
-            m = zeros(T)
-            m[flatnonzero(z_hat)]=1
-
-    return 𝝋(mask = m)
-    
-
-
-def C(s:list[int], 𝝋_star:𝝋) -> list[complex]: 
-    """lossless compression"""
-    z = fft(s)
+    return 𝝋(mask = optimal_lossless_filters(
+        S=asarray(s)[None],
+        θ=θ,
+        z=None if z is None else z[None]
+    )[0].astype(float))
+
+
+
+def C(s:list[int], 𝝋_star:𝝋, z:Optional[ndarray]=None) -> list[complex]:
+    """lossless compression (of the sequence's transform z, when already computed)"""
+    z = fft(s,axis=-1) if z is None else z
     return 𝝋_star(z)
 
 
-def K(s:list[int], 𝝋_star:𝝋, θ:float) -> int:
-    """Kolmogorov Complexity"""
-    z_hat = C(s=s, 𝝋_star=𝝋_star)
+def K(s:list[int], 𝝋_star:𝝋, θ:float, z:Optional[ndarray]=None) -> int:
+    """Kolmogorov Complexity (per sequence for a batch)"""
+    z_hat = C(s=s, 𝝋_star=𝝋_star, z=z)
     s_hat = inverse_C(z_hat=z_hat, θ=θ)
-    assert not ɛ(s=s,s_hat=s_hat), "fourier filter is not lossless!"
-    return count_nonzero(z_hat)
+    assert not ɛ(s=s,s_hat=s_hat).any(), "fourier filter is not lossless!"
+    return count_nonzero(z_hat,axis=-1)
 
 
 def normalised_fourier_bounded_kolmogorov_complexity_binary_sequences(
     s:list[int]
 ) -> float:
-    θ = 0.5
-    𝝋_star = 𝝋_prime_search(
-        s=s, 
-        θ=θ
-    )
+    return float(normalised_fourier_bounded_kolmogorov_complexity_binary_batch(
+        S=asarray(s)[None]
+    )[0])
+
+
+def normalised_fourier_bounded_kolmogorov_complexity_binary_batch(
+    S:ndarray,
+    θ:float=0.5
+) -> ndarray:
+    """
+    (n_sequences,) complexities of a (n_sequences,T) batch of binary sequences,
+    each transformed once and searched together (see optimal_lossless_filters)
+    """
+    S = asarray(S)
+    z = fft(S,axis=-1)
+    𝝋_star = 𝝋(mask = optimal_lossless_filters(S=S,θ=θ,z=z))
     min_description_length = K(
-        s=s, 
-        𝝋_star=𝝋_star, 
-        θ=θ
+        s=S,
+        𝝋_star=𝝋_star,
+        θ=θ,
+        z=z
     )
-    max_description_length = len(fft(s))
+    max_description_length = S.shape[-1]
     return min_description_length/max_description_length
 
 
 #-----------------------FOR REAL SEQUENCES----
 
 
-from scipy.fft import fft
 def fourier_bounded_kolmogorov_complexity(s:list[float]) -> float:
-    z = fft(s)
+    z = fft(s,axis=-1)
     z_magnitudes = abs(z.real) + abs(z.imag)
-    z_magnitudes_normalised = z_magnitudes/z_magnitudes.max()
-    return z_magnitudes_normalised.sum()
+    z_magnitudes_normalised = z_magnitudes/z_magnitudes.max(axis=-1,keepdims=True)
+    return z_magnitudes_normalised.sum(axis=-1)
+
+
+def fourier_bounded_kolmogorov_complexity_batch(S:ndarray) -> ndarray:
+    """(n_sequences,) complexities of a (n_sequences,T) batch of real sequences"""
+    return fourier_bounded_kolmogorov_complexity(s=asarray(S,dtype=float))
+
+#-----------------------FOR SEQUENCES TOO LONG TO FIT IN MEMORY----
+
+
+def chunked_complexities(
+    filename:str,
+    complexity:Callable[[ndarray],ndarray],
+    chunk_size:int=1024,
+    shape:Optional[Tuple[int,int]]=None,
+    dtype:Optional[str]=None
+) -> ndarray:
+    """
+    (n_sequences,) complexities of the (n_sequences,T) matrix stored in a .npy
+    file (or in a raw file of the given shape and dtype), read through
+    numpy.memmap chunk_size sequences at a time by a batch complexity
+    (e.g. normalised_fourier_bounded_kolmogorov_complexity_binary_batch),
+    so only one chunk of sequences is ever held in memory
+    """
+    sequences = load(filename,mmap_mode="r") if shape is None else memmap(filename,dtype=dtype,mode="r",shape=shape)
+    complexities = empty(sequences.shape[0])
+    for start in range(0,sequences.shape[0],chunk_size):
+        complexities[start:start+chunk_size] = complexity(array(sequences[start:start+chunk_size]))
+    return complexities
 
 #-----------------------
 
 
 
 if __name__ == "__main__":
-    from numpy import sin, pi
     from random import random
 
     t = 1000
@@ -121,14 +194,20 @@ if __name__ == "__main__":
     s4 = [sin(2*pi*0.05*i) for i in range(t)]
     s5 = [random() for _ in range(t)]
 
-    k1 = fourier_bounded_kolmogorov_complexity_real_sequences(s=s1)
-    k2 = fourier_bounded_kolmogorov_complexity_real_sequences(s=s2)
-    k3 = fourier_bounded_kolmogorov_complexity_real_sequences(s=s3)
-    k4 = fourier_bounded_kolmogorov_complexity_real_sequences(s=s4)
-    k5 = fourier_bounded_kolmogorov_complexity_real_sequences(s=s5)
+    k1 = fourier_bounded_kolmogorov_complexity(s=s1)
+    k2 = fourier_bounded_kolmogorov_complexity(s=s2)
+    k3 = fourier_bounded_kolmogorov_complexity(s=s3)
+    k4 = fourier_bounded_kolmogorov_complexity(s=s4)
+    k5 = fourier_bounded_kolmogorov_complexity(s=s5)
 
     print(k1)
     print(k2)
     print(k3)
     print(k4)
     print(k5)
+
+    b1 = [1 for _ in range(t)]
+    b2 = [i%2 for i in range(t)]
+    b3 = [int(random() < 0.5) for _ in range(t)]
+
+    print(normalised_fourier_bounded_kolmogorov_complexity_binary_batch(S=array([b1,b2,b3])))
@@ -1,14 +1,16 @@
-from numpy import fliplr, rot90, save, zeros, random
-from eca import OneDimensionalElementaryCellularAutomata 
+from argparse import ArgumentParser
+from typing import Iterator, Optional, Tuple
+from numpy import fliplr, ndarray, rot90, save, zeros, random
 
-def generate(path:str,width:int,depth:int,initial_condition:int, transient_time:int) -> None:
+from cellular_automata import ElementaryCellularAutomata
+from spacetime_dataset import SpacetimeDataset
+
+def spacetimes(width:int,depth:int,initial_condition:int, transient_time:int) -> Iterator[Tuple[str,ndarray]]:
     nothingness = zeros(shape=(width,depth),dtype=int)
-    with open(f"{path}/minimum_complexity.npy", 'wb') as spacetime_file:
-        save(spacetime_file, nothingness, allow_pickle=False)
+    yield "minimum_complexity", nothingness
 
     randomness = random.choice([0,1],size=(width,depth))
-    with open(f"{path}/maximum_complexity.npy", 'wb') as spacetime_file:
-        save(spacetime_file, randomness, allow_pickle=False)
+    yield "maximum_complexity", randomness
 
     symmetry_transformations = dict(
         identity    =lambda image:image,
@@ -16,16 +18,31 @@ def generate(path:str,width:int,depth:int,initial_condition:int, transient_time:
         rotation    =lambda image:rot90(image),
         reflection  =lambda image:fliplr(image),
     )
-    for rule in range(256):
-        ca = OneDimensionalElementaryCellularAutomata(
-            initial_configuration=initial_condition,
-            lattice_width=width
-        )
-        for _ in range(depth):
-            ca.transition(rule)
+    evolutions = ElementaryCellularAutomata.evolve(
+        rules=range(256),
+        initial_conditions=[initial_condition],
+        width=width,
+        depth=depth
+    )[:,0,transient_time:].astype(int)
+    for rule,spacetime_evolution in enumerate(evolutions):
         for symmetry,transform in symmetry_transformations.items():
-            with open(f"{path}/rule{rule}_ic{initial_condition}_{symmetry}.npy", 'wb') as spacetime_file:
-                spacetime_evolution = ca.evolution()[transient_time:]
-                save(spacetime_file, transform(image=spacetime_evolution), allow_pickle=False)
+            yield f"rule{rule}_ic{initial_condition}_{symmetry}", transform(image=spacetime_evolution)
+
+def generate(path:str,width:int,depth:int,initial_condition:int, transient_time:int, container:Optional[str]=None) -> None:
+    """
+    writes each spacetime to {path}/{key}.npy or, given a container name,
+    all of them to one bit-packed container {path}/{container} (see SpacetimeDataset)
+    """
+    evolutions = spacetimes(width=width,depth=depth,initial_condition=initial_condition,transient_time=transient_time)
+    if container is not None:
+        SpacetimeDataset.write(path=f"{path}/{container}", spacetimes=evolutions)
+        return
+    for key,spacetime_evolution in evolutions:
+        with open(f"{path}/{key}.npy", 'wb') as spacetime_file:
+            save(spacetime_file, spacetime_evolution, allow_pickle=False)
 
-generate(path="data",width=100,depth=110,initial_condition=8932,transient_time=10)
\ No newline at end of file
+if __name__ == "__main__":
+    parser = ArgumentParser(description="generate the spacetime dataset in data")
+    parser.add_argument("--container",help="write one bit-packed container data/CONTAINER (see SpacetimeDataset) instead of data/*.npy")
+    arguments = parser.parse_args()
+    generate(path="data",width=100,depth=110,initial_condition=8932,transient_time=10,container=arguments.container)
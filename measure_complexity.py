@@ -1,24 +1,657 @@
-from typing import Dict
+from typing import Dict, Iterable, List, Optional, Tuple
+from argparse import ArgumentParser
+from collections import deque
 from glob import glob 
-from json import dump
-from numpy import load
-from metrics import METRICS 
+from hashlib import blake2b
+from json import dump, load as load_json
+from os import makedirs
+from os.path import basename, splitext
+from threading import Lock
+from time import perf_counter
+from numpy import load, ndarray, save
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from metrics import METRICS, COMPRESSORS, HASHED_METRICS, GIL_RELEASING_METRICS, SLOW_METRICS, SYMMETRY_INVARIANCES, SYMMETRY_DERIVABLE_METRICS, METRIC_PARAMETERS, SymmetryCache, ResultCache, LosslessFourierCompression
+from metrics.serialisation import ByteSerialisation
+from metrics.symmetries import IDENTITY
+from metrics.instrumentation import INSTRUMENTATION, call_labelled, timed
+from results_store import ResultsStore
+from shared_spacetimes import Location, SharedSpacetimes
+from spacetime_dataset import SpacetimeDataset
+
+@timed("load_spacetime")
+def load_spacetime(filename:str) -> ndarray:
+    with open(filename, 'rb') as spacetime_file:
+        return load(spacetime_file)
+
+def measure_spacetime(spacetime_evolution:ndarray, metric_name:str) -> float:
+    """measure a registered metric on a spacetime (in a worker process)"""
+    return METRICS[metric_name](spacetime_evolution)
+
+@timed("metric")
+def measure_serialised(spacetime_evolution:ndarray, data:bytes, metric_name:str) -> float:
+    """a compressor metric of a spacetime from its serialisation (shared by every compressor cell of the spacetime)"""
+    return 1/COMPRESSORS[metric_name].compression_ratio(image=spacetime_evolution,data=data)
+
+def measure_shared_chunk(cells:List[Tuple[Location,str,dict]]) -> List[float]:
+    """measure a chunk of (shared spacetime, registered metric, instrumentation labels) cells (in a worker process)"""
+    return [
+        call_labelled(labels,measure_spacetime,SharedSpacetimes.attach(location),metric_name)
+        for location,metric_name,labels in cells
+    ]
+
+@timed("fourier_filter")
+def fourier_filter(spacetime_evolution:ndarray) -> Tuple[float,ndarray]:
+    """Fourier complexity and optimal lossless filter of a spacetime (in a worker process)"""
+    metric = LosslessFourierCompression(spacetime_evolution=spacetime_evolution)
+    return metric.complexity, metric.𝝋_star.m
+
+def search_shared_filter(location:Location) -> Tuple[float,ndarray]:
+    """Fourier complexity and optimal lossless filter of a shared spacetime (in a worker process)"""
+    return fourier_filter(SharedSpacetimes.attach(location))
+
+def derive_shared(location:Location, m:ndarray, θ:float, metric_name:str) -> float:
+    """
+    complexity of a shared spacetime under its orbit's permuted filter
+    (measured directly when the filter does not carry over, in a worker process)
+    """
+    spacetime_evolution = SharedSpacetimes.attach(location)
+    complexity = SymmetryCache.filtered_complexity(s=spacetime_evolution,m=m,θ=θ)
+    return measure_spacetime(spacetime_evolution,metric_name) if complexity is None else complexity
+
+def completed(value:float) -> Future:
+    future = Future()
+    future.set_result(value)
+    return future
+
+def measured_inline(function:callable, *args) -> Future:
+    """function(*args) run now (in this process), as a completed future"""
+    future = Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as exception:
+        future.set_exception(exception)
+    return future
+
+def cache_when_done(future:Future, results_cache:ResultCache, key:str, metric_name:str) -> None:
+    def put(future:Future) -> None:
+        if future.exception() is None:
+            results_cache.put(key=key,metric_name=metric_name,value=future.result())
+    future.add_done_callback(put)
+
+def forward(source:Future, targets:List[Future]) -> None:
+    """resolve targets with the items of source's result (or its exception) once it completes"""
+    def resolve(source:Future) -> None:
+        if source.exception() is not None:
+            for target in targets:
+                target.set_exception(source.exception())
+            return
+        for target,result in zip(targets,source.result()):
+            target.set_result(result)
+    source.add_done_callback(resolve)
+
+def follow(source:Future, target:Future, transform:callable=lambda result:result) -> None:
+    """resolve target with (the transform of) source's result, or its exception, once it completes"""
+    def resolve(source:Future) -> None:
+        if source.exception() is not None:
+            target.set_exception(source.exception())
+        else:
+            target.set_result(transform(source.result()))
+    source.add_done_callback(resolve)
+
+class Progress:
+    """
+    completed cells per metric, printed with throughput and ETA (when the
+    metric's total is known) at most every report_interval seconds
+    """
+    def __init__(self, totals:Dict[str,Optional[int]], report_interval:float=10.0) -> None:
+        self.totals = totals
+        self.done = dict.fromkeys(totals,0)
+        self.report_interval = report_interval
+        self.start = self.last_report = perf_counter()
+        self.last_completion = dict.fromkeys(totals,self.start)
+        self.lock = Lock()
+
+    def update(self, metric_name:str) -> None:
+        with self.lock:
+            self.done[metric_name] += 1
+            self.last_completion[metric_name] = perf_counter()
+            if self.last_completion[metric_name]-self.last_report >= self.report_interval:
+                self.report()
+
+    def report(self) -> None:
+        self.last_report = perf_counter()
+        for metric_name,total in self.totals.items():
+            done = self.done[metric_name]
+            elapsed = self.last_completion[metric_name]-self.start
+            throughput = done/elapsed if elapsed else 0.0
+            eta = f"{(total-done)/throughput:.0f}s" if throughput and total is not None else "unknown"
+            print(f"{metric_name}: {done}/{'?' if total is None else total} cells, {throughput:.1f} cells/s, ETA {eta}")
+
+def in_shard(key:str, shard_index:int=0, shard_count:int=1) -> bool:
+    """
+    whether a spacetime key falls in a shard, by a stable hash of its rule and
+    initial condition (so every symmetry variant of a spacetime lands on the
+    same shard and they still share work through the symmetry cache)
+    """
+    rule,ic,_ = SpacetimeDataset.parse_key(key)
+    shard_key = key if rule is None else f"rule{rule}_ic{ic}"
+    digest = blake2b(shard_key.encode(),digest_size=8).digest()
+    return int.from_bytes(digest,"big")%shard_count == shard_index
+
+def spacetime_key(filename:str) -> str:
+    return splitext(basename(filename))[0]
+
+def spacetime_labels(filename:str) -> dict:
+    """instrumentation labels of a spacetime's cells (so timings can be grouped per rule)"""
+    key = spacetime_key(filename)
+    rule,ic,symmetry = SpacetimeDataset.parse_key(key)
+    return dict(spacetime=key,rule=rule,ic=ic,symmetry=symmetry)
+
+def results_stem(shard_index:int=0, shard_count:int=1) -> str:
+    return "results/complexities" if shard_count == 1 else f"results/complexities.shard{shard_index}of{shard_count}"
+
+@timed("write_results")
+def write_results(
+    data_results:Dict[str,Dict[str,float]],
+    shard_index:int=0,
+    shard_count:int=1,
+    n_spacetimes:Optional[int]=None
+) -> None:
+    """results/complexities.json, or this shard's part of it (for merge_shards) when sharded"""
+    if shard_count == 1:
+        with open(f"{results_stem()}.json","w") as results_file:
+            dump(data_results, results_file, indent = 3)
+        return
+    with open(f"{results_stem(shard_index,shard_count)}.json","w") as results_file:
+        dump(dict(
+            shard_index=shard_index,
+            shard_count=shard_count,
+            n_spacetimes=n_spacetimes,
+            complexities=data_results
+        ), results_file, indent = 3)
+
+def write_instrumentation(shard_index:int=0, shard_count:int=1) -> None:
+    """
+    the run's timers and counters grouped per metric and rule next to its results
+    (and its Chrome trace, when tracing)
+    """
+    INSTRUMENTATION.export_json(f"{results_stem(shard_index,shard_count)}.instrumentation.json",by=("metric","rule"))
+    if INSTRUMENTATION.tracing:
+        INSTRUMENTATION.export_chrome_trace(f"{results_stem(shard_index,shard_count)}.trace.json")
+
+def merge_shards(results_path:str="results", allow_partial:bool=False) -> List[int]:
+    """
+    combine the shard result files into a new run of the results store
+    {results_path}/complexities.sqlite and its export {results_path}/complexities.json,
+    and return the indices of any missing shards (in which case nothing is
+    written unless allow_partial is set)
+    """
+    shards = list()
+    for filename in glob(f"{results_path}/complexities.shard*of*.json"):
+        with open(filename) as shard_file:
+            shards.append(load_json(shard_file))
+    assert shards, f"no shard result files in {results_path}"
+    shard_counts = set(shard["shard_count"] for shard in shards)
+    assert len(shard_counts) == 1, f"shard result files from different shard counts {sorted(shard_counts)}"
+    shard_count, = shard_counts
+    shards = sorted(shards,key=lambda shard:shard["shard_index"])
+    missing = sorted(set(range(shard_count))-set(shard["shard_index"] for shard in shards))
 
-def measure_dataset(data_path:str, complexity_metrics:Dict[str,callable]) -> None:
     data_results = dict()
-    for filename in glob(f"{data_path}/*.npy"):
-        print(filename)
-        with open(filename, 'rb') as spacetime_file:
-            spacetime_evolution = load(spacetime_file)
-        data_results[filename] = dict(map(
-            lambda metric_name,complexity_metric:(
-                metric_name,
-                complexity_metric(spacetime_evolution)
-            ),
-            complexity_metrics.keys(),
-            complexity_metrics.values()
-        ))    
-    with open("results/complexities.json","w") as results_file:
+    for shard in shards:
+        overlap = data_results.keys() & shard["complexities"].keys()
+        assert not overlap, f"shard {shard['shard_index']} repeats {len(overlap)} spacetimes of other shards"
+        data_results.update(shard["complexities"])
+    n_spacetimes = set(shard["n_spacetimes"] for shard in shards)
+    print(f"{len(shards)}/{shard_count} shards, {len(data_results)} spacetimes")
+    if missing:
+        print(f"missing shards: {missing}")
+    elif len(n_spacetimes) == 1 and None not in n_spacetimes:
+        expected, = n_spacetimes
+        assert len(data_results) == expected, f"shards hold {len(data_results)} of {expected} spacetimes"
+    if missing and not allow_partial:
+        return missing
+
+    filenames = sorted(sorted(data_results),key=lambda filename:"identity" not in filename)
+    data_results = dict((filename,data_results[filename]) for filename in filenames)
+    results_store = ResultsStore(f"{results_path}/complexities.sqlite")
+    results_store.append_results(data_results)
+    results_store.close()
+    with open(f"{results_path}/complexities.json","w") as results_file:
         dump(data_results, results_file, indent = 3)
+    return missing
+
+def measure_dataset(
+    data_path:str, 
+    complexity_metrics:Dict[str,callable],
+    shard_index:int=0,
+    shard_count:int=1,
+    container:Optional[str]=None,
+    **options
+) -> None:
+    """
+    measure_spacetimes on the files of a dataset ({data_path}/*.npy) or, given
+    a container name, on the spacetimes of the bit-packed container
+    {data_path}/{container} (see SpacetimeDataset, results are keyed as for
+    the files), loaded lazily (identity variants first, so each orbit's
+    Fourier filter is searched on its identity variant) and only for shard
+    shard_index (see in_shard), so the shard's result files record how many
+    spacetimes the whole dataset holds for merge_shards
+    """
+    if container is None:
+        keys = dict((spacetime_key(filename),filename) for filename in glob(f"{data_path}/*.npy"))
+        load_key = lambda key:load_spacetime(keys[key])
+    else:
+        dataset = SpacetimeDataset(f"{data_path}/{container}")
+        keys = dataset.keys()
+        load_key = timed("load_spacetime")(dataset.__getitem__)
+    shard_keys = [
+        key
+        for key in sorted(keys,key=lambda key:"identity" not in key)
+        if in_shard(key,shard_index,shard_count)
+    ]
+    measure_spacetimes(
+        ((key,load_key(key)) for key in shard_keys),
+        complexity_metrics=complexity_metrics,
+        data_path=data_path,
+        shard_index=shard_index,
+        shard_count=shard_count,
+        n_spacetimes=len(shard_keys),
+        n_dataset_spacetimes=len(keys),
+        **options
+    )
+
+class SpacetimeScheduler:
+    """
+    the cells of the spacetimes in flight (see measure_spacetimes): each cell
+    is read from the results cache (cached), shared or derived from its orbit's
+    filter through the symmetry cache (shared_cell, derived_cell), or else
+    dispatched to the thread or process pool (dispatch), and appended to the
+    results store as soon as it completes (record)
+    """
+    def __init__(
+        self,
+        complexity_metrics:Dict[str,callable],
+        threads:ThreadPoolExecutor,
+        processes:ProcessPoolExecutor,
+        results_store:ResultsStore,
+        progress:Progress,
+        threaded_metrics:Tuple[str,...]=GIL_RELEASING_METRICS,
+        slow_metrics:Tuple[str,...]=SLOW_METRICS,
+        chunk_size:int=16,
+        symmetries:Optional[SymmetryCache]=None,
+        results_cache:Optional[ResultCache]=None
+    ) -> None:
+        self.complexity_metrics = complexity_metrics
+        self.threads = threads
+        self.processes = processes
+        self.results_store = results_store
+        self.progress = progress
+        self.threaded_metrics = threaded_metrics
+        self.slow_metrics = slow_metrics
+        self.chunk_size = chunk_size
+        self.symmetries = symmetries
+        self.results_cache = results_cache
+        self.metric_indices = dict((metric_name,index) for index,metric_name in enumerate(complexity_metrics))
+        self.data_results = dict()
+        self.in_flight = deque()
+        self.pending = list()
+        self.representatives = dict()
+        self.derivations = dict()
+        self.shared = dict()
+        self.lock = Lock()
+
+    def registered(self, metric_name:str) -> bool:
+        """whether a metric is the one registered in METRICS (so it can be measured in a worker process or shared)"""
+        return METRICS.get(metric_name) is self.complexity_metrics[metric_name]
+
+    def record(self, future:Future, filename:str, metric_name:str, spacetime_index:int) -> None:
+        """append the cell to the results store (and update the progress) once it completes"""
+        future.add_done_callback(lambda future:self.append(future,filename,metric_name,spacetime_index))
+
+    def append(self, future:Future, filename:str, metric_name:str, spacetime_index:int) -> None:
+        if future.exception() is not None:
+            return
+        self.results_store.append(
+            filename=filename,
+            metric_name=metric_name,
+            value=future.result(),
+            spacetime_index=spacetime_index,
+            metric_index=self.metric_indices[metric_name]
+        )
+        self.progress.update(metric_name)
 
-measure_dataset(data_path="data",complexity_metrics = METRICS)
+    def cached(self, content_key:Optional[str], hashes:Optional[dict], metric_name:str) -> Optional[float]:
+        """the cell's value in the results cache (searched, or else derived), if any"""
+        if content_key is None:
+            return None
+        cache_keys = [
+            self.results_cache.key(content_key,metric_name,derived=derived)
+            for derived in ((False,True) if self.derivable(hashes,metric_name) else (False,))
+        ]
+        return next((value for value in (self.results_cache.get(key) for key in cache_keys) if value is not None),None)
+
+    def cache(self, future:Future, content_key:Optional[str], metric_name:str, derived:bool) -> None:
+        """write the cell to the results cache once it completes"""
+        if content_key is not None:
+            cache_when_done(
+                future=future,
+                results_cache=self.results_cache,
+                key=self.results_cache.key(content_key,metric_name,derived=derived),
+                metric_name=metric_name
+            )
+
+    def derivable(self, hashes:Optional[dict], metric_name:str) -> bool:
+        return hashes is not None and metric_name in self.symmetries.derivable and self.registered(metric_name)
+
+    def shared_cell(self, key:Optional[str], labels:dict) -> Optional[Future]:
+        """the value of a variant already measured (or being measured) under the same symmetry cache key"""
+        if key is not None and key in self.symmetries.values:
+            INSTRUMENTATION.count("shared_cells",metric=labels["metric"],rule=labels["rule"])
+            return completed(self.symmetries.values[key])
+        if key is not None and key in self.shared:
+            INSTRUMENTATION.count("shared_cells",metric=labels["metric"],rule=labels["rule"])
+            return self.shared[key]
+        return None
+
+    def derived_cell(self, location:Location, hashes:dict, labels:dict) -> Tuple[Future,bool]:
+        """
+        the future complexity of a derivable cell and whether it is derived from
+        its orbit's filter (rather than searched, on the orbit's first variant
+        and its exact duplicates, whose search is submitted here)
+        """
+        future = Future()
+        orbit = self.symmetries.orbit_key(hashes)
+        if orbit not in self.representatives and not self.symmetries.has_filter(hashes):
+            search = INSTRUMENTATION.submit(
+                self.processes,
+                call_labelled,
+                labels,
+                search_shared_filter,
+                location
+            )
+            self.representatives[orbit] = hashes[IDENTITY],search
+            search.add_done_callback(lambda search:self.searched(search,orbit,hashes))
+        if orbit in self.representatives and self.representatives[orbit][0] == hashes[IDENTITY]:
+            follow(source=self.representatives[orbit][1],target=future,transform=lambda result:result[0])
+            return future,False
+        with self.lock:
+            ready = self.symmetries.has_filter(hashes)
+            if not ready:
+                self.derivations.setdefault(orbit,list()).append((future,location,hashes,labels))
+        if ready:
+            self.derive(future,location,hashes,labels)
+        return future,True
+
+    def searched(self, search:Future, orbit:str, hashes:dict) -> None:
+        """store the orbit's filter once its search completes and derive its waiting variants"""
+        with self.lock:
+            if search.exception() is None:
+                _,m = search.result()
+                self.symmetries.store_filter(hashes=hashes,m=m)
+            waiting = self.derivations.pop(orbit,list())
+        for future,location,variant_hashes,labels in waiting:
+            if search.exception() is not None:
+                future.set_exception(search.exception())
+            else:
+                self.derive(future,location,variant_hashes,labels)
+
+    def derive(self, future:Future, location:Location, hashes:dict, labels:dict) -> None:
+        follow(
+            source=INSTRUMENTATION.submit(
+                self.processes,
+                call_labelled,
+                labels,
+                derive_shared,
+                location,
+                self.symmetries.variant_filter(hashes),
+                self.symmetries.θ,
+                labels["metric"]
+            ),
+            target=future
+        )
+        INSTRUMENTATION.count("derived_cells",metric=labels["metric"],rule=labels["rule"])
+
+    def serialisable(self, metric_name:str) -> bool:
+        return metric_name in COMPRESSORS and metric_name in self.threaded_metrics and self.registered(metric_name)
+
+    def dispatch(self, spacetime_evolution:ndarray, location:Location, hashes:Optional[dict], data:Optional[bytes], labels:dict) -> Future:
+        """
+        measure a cell: hashed metrics in this process, compressors (on the
+        spacetime's serialisation data) and other GIL-releasing or unregistered
+        metrics on the thread pool, slow metrics one per process-pool task and
+        the rest in process-pool chunks
+        """
+        metric_name = labels["metric"]
+        if hashes is not None and metric_name in HASHED_METRICS and self.registered(metric_name):
+            return measured_inline(call_labelled,labels,HASHED_METRICS[metric_name],spacetime_evolution,hashes)
+        if self.serialisable(metric_name):
+            return self.threads.submit(call_labelled,labels,measure_serialised,spacetime_evolution,data,metric_name)
+        if metric_name in self.threaded_metrics or not self.registered(metric_name):
+            return self.threads.submit(call_labelled,labels,self.complexity_metrics[metric_name],spacetime_evolution)
+        future = Future()
+        if metric_name in self.slow_metrics:
+            self.submit_chunk([(future,location,metric_name,labels)])
+        else:
+            self.pending.append((future,location,metric_name,labels))
+            if len(self.pending) == self.chunk_size:
+                self.flush()
+        return future
+
+    def submit_chunk(self, chunk:List[Tuple[Future,Location,str,dict]]) -> None:
+        forward(
+            source=INSTRUMENTATION.submit(
+                self.processes,
+                measure_shared_chunk,
+                [(location,metric_name,labels) for _,location,metric_name,labels in chunk]
+            ),
+            targets=[future for future,_,_,_ in chunk]
+        )
+
+    def flush(self) -> None:
+        """submit the pending process-pool cells as one chunk"""
+        self.submit_chunk(list(self.pending))
+        self.pending.clear()
+
+    def cell(self, filename:str, spacetime_evolution:ndarray, location:Location, hashes:Optional[dict], data:Optional[bytes], metric_name:str) -> Tuple[Future,Optional[str],bool]:
+        """
+        the future complexity of a cell, its symmetry cache key (when it is
+        computed rather than shared) and whether it is derived from another
+        variant's filter rather than searched
+        """
+        labels = dict(spacetime_labels(filename),metric=metric_name)
+        if self.derivable(hashes,metric_name):
+            future,derived = self.derived_cell(location,hashes,labels)
+            return future,None,derived
+        key = None if hashes is None else self.symmetries.key(hashes,metric_name)
+        future = self.shared_cell(key,labels)
+        if future is not None:
+            return future,None,False
+        future = self.dispatch(spacetime_evolution,location,hashes,data,labels)
+        if key is not None:
+            self.shared[key] = future
+        return future,key,False
+
+    def schedule(self, filename:str, spacetime_evolution:ndarray) -> None:
+        """submit (or share, or read from the results cache) every cell of a spacetime"""
+        spacetime_index = len(self.data_results)+len(self.in_flight)
+        shared_spacetime = SharedSpacetimes({filename:spacetime_evolution})
+        self.in_flight.append((filename,shared_spacetime,dict()))
+        location = shared_spacetime.locations[filename]
+        hashes = None if self.symmetries is None else self.symmetries.variant_hashes(spacetime_evolution)
+        content_key = None if self.results_cache is None else self.results_cache.content_key(spacetime_evolution)
+        data = ByteSerialisation.serialise(spacetime_evolution) if any(map(self.serialisable,self.complexity_metrics)) else None
+        rule = spacetime_labels(filename)["rule"]
+        for metric_name in self.complexity_metrics:
+            complexity = self.cached(content_key,hashes,metric_name)
+            if complexity is not None:
+                future,key = completed(complexity),None
+                INSTRUMENTATION.count("cached_cells",metric=metric_name,rule=rule)
+            else:
+                future,key,derived = self.cell(filename,spacetime_evolution,location,hashes,data,metric_name)
+                self.cache(future,content_key,metric_name,derived)
+            self.record(future,filename,metric_name,spacetime_index)
+            self.in_flight[-1][2][metric_name] = (future,key)
+
+    def collect(self) -> None:
+        """wait for the oldest spacetime's cells and release its shared memory"""
+        filename,shared_spacetime,cells = self.in_flight[0]
+        if self.pending:
+            self.flush()
+        self.data_results[filename] = dict.fromkeys(self.complexity_metrics)
+        for metric_name,(future,key) in cells.items():
+            complexity = future.result()
+            if key is not None:
+                self.symmetries.values[key] = complexity
+                self.shared.pop(key,None)
+            self.data_results[filename][metric_name] = complexity
+        self.in_flight.popleft()
+        shared_spacetime.close()
+
+    def close(self) -> None:
+        """release the shared memory of the spacetimes still in flight (after an error)"""
+        for _,shared_spacetime,_ in self.in_flight:
+            shared_spacetime.close()
+
+
+def measure_spacetimes(
+    spacetimes:Iterable[Tuple[str,ndarray]],
+    complexity_metrics:Dict[str,callable],
+    data_path:str="data",
+    save_spacetimes:bool=False,
+    max_in_flight:int=64,
+    threaded_metrics:Tuple[str,...]=GIL_RELEASING_METRICS,
+    slow_metrics:Tuple[str,...]=SLOW_METRICS,
+    n_threads:Optional[int]=None,
+    n_processes:Optional[int]=None,
+    chunk_size:int=16,
+    report_interval:float=10.0,
+    symmetries:Optional[SymmetryCache]=None,
+    results_cache:Optional[ResultCache]=None,
+    shard_index:int=0,
+    shard_count:int=1,
+    n_spacetimes:Optional[int]=None,
+    n_dataset_spacetimes:Optional[int]=None
+) -> None:
+    """
+    measure every (key, spacetime) of a generator (such as generate_data.spacetimes,
+    so no spacetime has to be written and read back), keyed by {data_path}/{key}.npy:
+    the generator is only advanced while fewer than max_in_flight spacetimes
+    are being measured (the oldest is collected first), and each spacetime is
+    saved to that file only when save_spacetimes is set
+
+    compressor-backed metrics (which release the GIL) run on a shared thread pool
+    on the arrays, Python-bound metrics registered in METRICS run on a process
+    pool of n_processes workers reading each in-flight spacetime from its own
+    shared memory block (so no arrays are pickled): cells of slow_metrics
+    (the Fourier filter searches) are submitted one per task as soon as their
+    spacetime arrives, with or without a symmetry cache, and the remaining cells
+    follow in chunks of chunk_size, so cheap cells keep every worker busy while
+    the last searches finish
+
+    each cell is appended to the results store results/complexities.sqlite
+    (see ResultsStore) as soon as it completes and the run is marked completed
+    once every cell is in, per-metric throughput and ETA
+    (out of n_spacetimes, when known) are printed every report_interval seconds,
+    and the JSON export results/complexities.json is written once every cell is done
+
+    with a symmetry cache, each metric is computed once per cache key, the
+    HASHED_METRICS are measured in this process from the block counts their
+    variants share, and,
+    for the cache's derivable metrics, the Fourier filter is searched once per
+    D4/inversion orbit (on the orbit's first spacetime to arrive), whose exact
+    duplicates take its searched complexity, and every other variant's
+    complexity is derived from it on the process pool as soon as the orbit's
+    search completes
+
+    with a results cache, only cells missing from the cache are computed
+    and each one is written to it as soon as it completes (so an
+    interrupted run resumes where it stopped)
+
+    with shard_count > 1, only the spacetimes of shard shard_index are measured
+    (see in_shard) and written to that shard's result files, which merge_shards
+    combines with the others (n_dataset_spacetimes, when known, is the number
+    of spacetimes across every shard)
+    """
+    progress = Progress(totals=dict.fromkeys(complexity_metrics,n_spacetimes),report_interval=report_interval)
+    if save_spacetimes:
+        makedirs(data_path, exist_ok=True)
+    results_store = ResultsStore(f"{results_stem(shard_index,shard_count)}.sqlite")
+    results_store.start_run()
+    with ThreadPoolExecutor(max_workers=n_threads) as threads, ProcessPoolExecutor(max_workers=n_processes) as processes:
+        scheduler = SpacetimeScheduler(
+            complexity_metrics=complexity_metrics,
+            threads=threads,
+            processes=processes,
+            results_store=results_store,
+            progress=progress,
+            threaded_metrics=threaded_metrics,
+            slow_metrics=slow_metrics,
+            chunk_size=chunk_size,
+            symmetries=symmetries,
+            results_cache=results_cache
+        )
+        try:
+            for key,spacetime_evolution in spacetimes:
+                if not in_shard(key,shard_index,shard_count):
+                    continue
+                filename = f"{data_path}/{key}.npy"
+                if save_spacetimes:
+                    with open(filename, 'wb') as spacetime_file:
+                        save(spacetime_file, spacetime_evolution, allow_pickle=False)
+                if len(scheduler.in_flight) == max_in_flight:
+                    scheduler.collect()
+                scheduler.schedule(filename,spacetime_evolution)
+            while scheduler.in_flight:
+                scheduler.collect()
+        finally:
+            scheduler.close()
+
+    results_store.finish_run()
+    results_store.close()
+    progress.report()
+    write_results(
+        data_results=scheduler.data_results,
+        shard_index=shard_index,
+        shard_count=shard_count,
+        n_spacetimes=n_dataset_spacetimes
+    )
+    if INSTRUMENTATION.enabled:
+        write_instrumentation(shard_index=shard_index,shard_count=shard_count)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="measure the complexity of every spacetime in data")
+    parser.add_argument("--shard-index",type=int,default=0,help="which shard of the dataset to measure")
+    parser.add_argument("--shard-count",type=int,default=1,help="number of shards the dataset is split into")
+    parser.add_argument("--merge",action="store_true",help="combine the shard result files into results/complexities.json")
+    parser.add_argument("--allow-partial",action="store_true",help="merge even if some shards are missing")
+    parser.add_argument("--instrument",action="store_true",help="time each stage per metric and rule into results/complexities.instrumentation.json")
+    parser.add_argument("--derive-symmetries",action="store_true",help="derive the Fourier complexity of rotated, reflected and inverted variants from their orbit's filter instead of searching each one (faster, but derived values can differ from searched ones)")
+    parser.add_argument("--container",help="measure the bit-packed container data/CONTAINER (see SpacetimeDataset) instead of data/*.npy")
+    parser.add_argument("--trace",action="store_true",help="also write a Chrome trace of every timed stage to results/complexities.trace.json")
+    arguments = parser.parse_args()
+    assert 0 <= arguments.shard_index < arguments.shard_count, "shard index must be below the shard count"
+    if arguments.instrument or arguments.trace:
+        INSTRUMENTATION.enable(trace=arguments.trace)
+
+    if arguments.merge:
+        missing = merge_shards(results_path="results",allow_partial=arguments.allow_partial)
+        if missing and not arguments.allow_partial:
+            raise SystemExit(1)
+    else:
+        measure_dataset(
+            data_path="data",
+            complexity_metrics = METRICS,
+            symmetries=SymmetryCache(
+                invariances=SYMMETRY_INVARIANCES,
+                derivable=SYMMETRY_DERIVABLE_METRICS if arguments.derive_symmetries else ()
+            ),
+            results_cache=ResultCache(
+                path="results/cache",
+                metric_parameters=METRIC_PARAMETERS,
+                derivable_metrics=SYMMETRY_DERIVABLE_METRICS
+            ),
+            shard_index=arguments.shard_index,
+            shard_count=arguments.shard_count,
+            container=arguments.container
+        )
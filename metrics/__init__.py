@@ -6,6 +6,9 @@ from metrics.zlib import ZLIB
 from metrics.bz2 import BZ2
 from metrics.lzma import LempelZivMarkovChainAlgorithm
 from metrics.bdm import BlockDecompositionMethod
+from metrics.symmetries import SymmetryCache, INVERSION_GROUP
+from metrics.result_cache import ResultCache
+from metrics.instrumentation import timed
 
 bdm = BlockDecompositionMethod()
 
@@ -18,4 +21,43 @@ METRICS = dict(
     BZ2=lambda s:1/BZ2.compression_ratio(image=s),
     LZMA=lambda s:1/LempelZivMarkovChainAlgorithm.compression_ratio(image=s),
     BlockDecompositionMethod=lambda s:bdm.shannon_entropy(image=s)
-  )
\ No newline at end of file
+  )
+METRICS = dict(
+    (metric_name,timed("metric",metric=metric_name)(complexity_metric))
+    for metric_name,complexity_metric in METRICS.items()
+)
+
+HASHED_METRICS = dict(
+    BlockDecompositionMethod=lambda s,hashes:bdm.shannon_entropy(image=s,hashes=hashes)
+)
+"""
+METRICS entries given a spacetime's symmetry variant hashes as well, to share
+work between variants (memoised in this process, so measured in the driver's)
+"""
+HASHED_METRICS = dict(
+    (metric_name,timed("metric",metric=metric_name)(complexity_metric))
+    for metric_name,complexity_metric in HASHED_METRICS.items()
+)
+
+GIL_RELEASING_METRICS = ("ZLIB","GZIP","BZ2","LZMA")
+COMPRESSORS = dict(ZLIB=ZLIB,GZIP=GZIP,BZ2=BZ2,LZMA=LempelZivMarkovChainAlgorithm)
+"""the compressor of each METRICS entry that is 1/its compression ratio (they can share one ByteSerialisation)"""
+SLOW_METRICS = ("LosslessFourierCompression",)
+
+SYMMETRY_INVARIANCES = dict(
+    RunLengthEncoding=INVERSION_GROUP,
+    HuffmanEncoding=INVERSION_GROUP,
+    BlockDecompositionMethod=INVERSION_GROUP,
+)
+SYMMETRY_DERIVABLE_METRICS = ("LosslessFourierCompression",)
+
+METRIC_PARAMETERS = dict(
+    LosslessFourierCompression=dict(version=1,quantisation_threshold=0.5),
+    RunLengthEncoding=dict(version=1,maximum_run_length=RunLengthEncoding.MAXIMUM_RUN_LENGTH),
+    HuffmanEncoding=dict(version=1,pixel_stride=3),
+    ZLIB=dict(version=1,level=9),
+    GZIP=dict(version=1,compresslevel=9),
+    BZ2=dict(version=1,compresslevel=9),
+    LZMA=dict(version=1),
+    BlockDecompositionMethod=dict(version=1),
+)
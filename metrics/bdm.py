@@ -1,9 +1,187 @@
-from pybdm import BDM
-from numpy import ndarray 
+from collections import OrderedDict
+from itertools import product
+from typing import Dict, Optional, Tuple, Union
+from pybdm.utils import get_ctm_dataset
+from numpy import ndarray, arange, array, ascontiguousarray, bincount, full, log2, uint8, unique
+from numpy.lib.stride_tricks import as_strided
+
+from metrics.symmetries import Symmetry, IDENTITY, D4_INVERSION_GROUP, apply_symmetry
+
+Histogram = Tuple[ndarray,ndarray]
+"""(block codes, counts) of the distinct blocks of a spacetime"""
 
 class BlockDecompositionMethod:
-    def __init__(self) -> None:
-        self.model = BDM(ndim=2)
-    
-    def shannon_entropy(self, image:ndarray) -> str:
-        return self.model.ent(image)
\ No newline at end of file
+    """
+    block entropy and BDM of binary spacetimes (as pybdm's BDM(ndim=2).ent and .bdm):
+    each spacetime is partitioned into non-overlapping 4×4 blocks (incomplete
+    blocks at the boundaries are ignored), each block is encoded as the 16 bit
+    integer of its row-major bits, and its CTM value is looked up in an array
+    indexed by that code (loaded from pybdm's CTM-B2-D4x4 on first use)
+
+    given a spacetime's symmetry variant hashes (see SymmetryCache.variant_hashes),
+    its block histogram is memoised under its hash (up to max_histograms), and
+    a spacetime whose variant is remembered takes that variant's histogram with
+    the block codes permuted, wherever the spacetime's partition is the permuted
+    partition of the variant (see shared_histogram), instead of being counted
+    """
+    BLOCK_SIZE = 4
+    CTM_DATASET = "CTM-B2-D4x4"
+    WEIGHTS = 2**arange(BLOCK_SIZE**2-1,-1,-1)
+    ctm:Optional[ndarray] = None
+    permutations:Dict[Symmetry,ndarray] = dict()
+    inverses:Dict[Symmetry,Symmetry] = dict()
+
+    def __init__(self, max_histograms:int=1024) -> None:
+        self.max_histograms = max_histograms
+        self.histograms:OrderedDict[str,Histogram] = OrderedDict()
+
+    @classmethod
+    def ctm_table(cls) -> ndarray:
+        """CTM value of every block code (pybdm's keys are normalised to start with a 0)"""
+        if cls.ctm is None:
+            shape = (cls.BLOCK_SIZE,cls.BLOCK_SIZE)
+            ctm,missing = get_ctm_dataset(cls.CTM_DATASET)
+            codes = array([int(key,2) for key in ctm[shape]])
+            values = array(list(ctm[shape].values()))
+            cls.ctm = full(2**len(cls.WEIGHTS),missing[shape])
+            cls.ctm[codes] = values
+            cls.ctm[codes^(2**len(cls.WEIGHTS)-1)] = values
+        return cls.ctm
+
+    @staticmethod
+    def block_codes(image:ndarray) -> ndarray:
+        """(B,n_blocks) codes of the 4×4 blocks of a (B,ω,T) stack, read through a strided view"""
+        b = BlockDecompositionMethod.BLOCK_SIZE
+        image = ascontiguousarray(image,dtype=uint8)
+        B,x,y = image.shape
+        stride_B,stride_x,stride_y = image.strides
+        blocks = as_strided(
+            image,
+            shape=(B,x//b,y//b,b,b),
+            strides=(stride_B,b*stride_x,b*stride_y,stride_x,stride_y),
+            writeable=False
+        )
+        return blocks.reshape(B,(x//b)*(y//b),b*b) @ BlockDecompositionMethod.WEIGHTS
+
+    @staticmethod
+    def count_blocks(image:ndarray) -> Tuple[ndarray,ndarray,ndarray]:
+        """
+        (image index, block code, count) of the distinct blocks
+        of every image in a (B,ω,T) stack, sorted by image
+        """
+        codes = BlockDecompositionMethod.block_codes(image)
+        n_codes = 2**BlockDecompositionMethod.BLOCK_SIZE**2
+        keys,counts = unique(
+            (arange(len(codes))[:,None]*n_codes+codes).reshape(codes.size),
+            return_counts=True
+        )
+        return keys//n_codes,keys%n_codes,counts
+
+    @staticmethod
+    def histogram_entropy(images:ndarray, counts:ndarray, n_images:int) -> ndarray:
+        n_blocks = bincount(images,weights=counts,minlength=n_images)
+        p = counts/n_blocks[images]
+        return bincount(images,weights=p*log2(1/p),minlength=n_images)
+
+    @staticmethod
+    def histogram_bdm(images:ndarray, codes:ndarray, counts:ndarray, n_images:int) -> ndarray:
+        return bincount(
+            images,
+            weights=BlockDecompositionMethod.ctm_table()[codes]+log2(counts),
+            minlength=n_images
+        )
+
+    @staticmethod
+    def histogram(image:ndarray) -> Histogram:
+        """(block codes, counts) of a (ω,T) spacetime"""
+        _,codes,counts = BlockDecompositionMethod.count_blocks(image[None])
+        return codes,counts
+
+    def remember(self, key:str, histogram:Histogram) -> Histogram:
+        self.histograms[key] = histogram
+        if len(self.histograms) > self.max_histograms:
+            self.histograms.popitem(last=False)
+        return histogram
+
+    @staticmethod
+    def aligned(shape:Tuple[int,int], g:Symmetry) -> bool:
+        """
+        whether the blocks of apply_symmetry(s,g) are the blocks of s with g
+        applied (a flip only keeps the partition when the flipped axis is
+        a whole number of blocks long)
+        """
+        transpose,flip_rows,flip_columns,_ = g
+        x,y = shape[::-1] if transpose else shape
+        b = BlockDecompositionMethod.BLOCK_SIZE
+        return (not flip_rows or not x%b) and (not flip_columns or not y%b)
+
+    @classmethod
+    def permutation(cls, g:Symmetry) -> ndarray:
+        """code of every block with g applied, indexed by the block's code"""
+        if g not in cls.permutations:
+            b = cls.BLOCK_SIZE
+            transpose,flip_rows,flip_columns,invert = g
+            blocks = ((arange(2**b**2)[:,None] & cls.WEIGHTS) != 0).astype(uint8).reshape(-1,b,b)
+            blocks = blocks.transpose(0,2,1) if transpose else blocks
+            blocks = blocks[:,::-1] if flip_rows else blocks
+            blocks = blocks[:,:,::-1] if flip_columns else blocks
+            blocks = 1-blocks if invert else blocks
+            cls.permutations[g] = cls.block_codes(blocks)[:,0]
+        return cls.permutations[g]
+
+    @classmethod
+    def inverse(cls, g:Symmetry) -> Symmetry:
+        """the symmetry undoing g"""
+        if not cls.inverses:
+            s = arange(6).reshape(2,3)
+            for g,h in product(D4_INVERSION_GROUP,repeat=2):
+                undone = apply_symmetry(apply_symmetry(s,g),h)
+                if undone.shape == s.shape and (undone == s).all():
+                    cls.inverses[g] = h
+        return cls.inverses[g]
+
+    def shared_histogram(self, image:ndarray, hashes:Dict[Symmetry,str]) -> Histogram:
+        """
+        histogram of a (ω,T) spacetime given its variant hashes: the permuted
+        histogram of a remembered variant whose partition permutes onto the
+        spacetime's, or else its own count (remembered under its hash)
+        """
+        for g,key in hashes.items():
+            if key not in self.histograms:
+                continue
+            h = BlockDecompositionMethod.inverse(g)
+            if BlockDecompositionMethod.aligned(image.shape[::-1] if g[0] else image.shape,h):
+                self.histograms.move_to_end(key)
+                codes,counts = self.histograms[key]
+                return BlockDecompositionMethod.permutation(h)[codes],counts
+        return self.remember(hashes[IDENTITY],BlockDecompositionMethod.histogram(image))
+
+    def shannon_entropy(self, image:ndarray, hashes:Optional[Dict[Symmetry,str]]=None) -> Union[float,ndarray]:
+        """
+        block entropy (bits) of a spacetime (from the histogram it shares with
+        its variants given its hashes), or of each spacetime of a (B,ω,T)
+        stack: 0 for a spacetime without a complete block (as pybdm's ent,
+        which returns 0)
+        """
+        if image.ndim == 3:
+            images,_,counts = BlockDecompositionMethod.count_blocks(image)
+            return BlockDecompositionMethod.histogram_entropy(images,counts,len(image))
+        _,counts = BlockDecompositionMethod.histogram(image) if hashes is None else self.shared_histogram(image,hashes)
+        p = counts/counts.sum()
+        return float((p*log2(1/p)).sum())
+
+    def bdm(self, image:ndarray, hashes:Optional[Dict[Symmetry,str]]=None) -> Union[float,ndarray]:
+        """
+        BDM (bits) of a spacetime (from the histogram it shares with its
+        variants given its hashes), or of each spacetime of a (B,ω,T) stack:
+        a ValueError for a spacetime without a complete block (as pybdm's bdm,
+        which fails rather than return 0)
+        """
+        b = BlockDecompositionMethod.BLOCK_SIZE
+        if image.shape[-2] < b or image.shape[-1] < b:
+            raise ValueError(f"no complete {b}×{b} block in a {image.shape[-2]}×{image.shape[-1]} spacetime")
+        if image.ndim == 3:
+            images,codes,counts = BlockDecompositionMethod.count_blocks(image)
+            return BlockDecompositionMethod.histogram_bdm(images,codes,counts,len(image))
+        codes,counts = BlockDecompositionMethod.histogram(image) if hashes is None else self.shared_histogram(image,hashes)
+        return float((BlockDecompositionMethod.ctm_table()[codes]+log2(counts)).sum())
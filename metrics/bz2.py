@@ -1,21 +1,26 @@
 from bz2 import compress, decompress
-from numpy import array, ndarray
-from typing import Tuple
+from numpy import ndarray
+from typing import Optional, Tuple
+
+from metrics.serialisation import ByteSerialisation
 
 class BZ2:
     @staticmethod
-    def compress_image(image:ndarray) -> str:
+    def compress_image(image:ndarray, packed:bool=False, data:Optional[bytes]=None) -> str:
         return compress(
-            data=''.join(map(str,image.flatten())).encode(),
+            data=ByteSerialisation.serialise(image,packed=packed) if data is None else data,
             compresslevel=9
         )
     
     @staticmethod
-    def decompress_image(encoded_image:str, image_shape:Tuple[int,int]) -> ndarray:
-        return array(list(map(
-            int,decompress(data=encoded_image).decode()
-        ))).reshape(image_shape)
+    def decompress_image(encoded_image:str, image_shape:Tuple[int,int], packed:bool=False) -> ndarray:
+        return ByteSerialisation.deserialise(
+            data=decompress(data=encoded_image),
+            image_shape=image_shape,
+            packed=packed
+        )
 
     @staticmethod
-    def compression_ratio(image:ndarray) -> float:
-        return len(''.join(map(str,image.flatten())).encode())/len(BZ2.compress_image(image))
\ No newline at end of file
+    def compression_ratio(image:ndarray, packed:bool=False, data:Optional[bytes]=None) -> float:
+        data = ByteSerialisation.serialise(image,packed=packed) if data is None else data
+        return len(data)/len(BZ2.compress_image(image,packed=packed,data=data))
\ No newline at end of file
@@ -1,95 +1,184 @@
-from typing import Dict, List, Tuple
-from numpy import ndarray, array
+from heapq import heapify, heappop, heappush
+from itertools import count
+from typing import Dict, Tuple
+from numpy import ndarray, arange, bincount, concatenate, cumsum, flatnonzero, full, packbits, unpackbits, zeros, int64, uint8
 
 
 class HuffmanEncoding:
+    """
+    Huffman coding of strides of pixels of a binary (0/1) image,
+    each stride packed into an integer symbol
+    """
     @staticmethod
-    def compression_ratio(image:ndarray) -> float:
-        code,_ = HuffmanEncoding.encode(image)
-        return len(''.join(map(str,image.flatten())))/len(code)
+    def compression_ratio(image:ndarray,pixel_stride:int=3) -> float:
+        frequencies = HuffmanEncoding.frequency_table(image=image,pixel_stride=pixel_stride)
+        code_lengths = HuffmanEncoding.code_lengths(
+            node=HuffmanEncoding.build_tree(frequency_table=frequencies)
+        )
+        return image.size/sum(
+            frequency*code_lengths[symbol] for symbol,frequency in frequencies.items()
+        )
 
     @staticmethod
-    def encode(image:ndarray,pixel_stride:int=3) -> Tuple[str,Dict[str,str]]:
-        huffman_code_to_original = HuffmanEncoding.huffman_table(image=image)
+    def encode(image:ndarray,pixel_stride:int=3) -> Tuple[ndarray,int,Dict[int,int]]:
+        """packed code bits, number of code bits and the code length of each symbol"""
+        symbols = HuffmanEncoding.symbols(image=image,pixel_stride=pixel_stride)
+        code_lengths = HuffmanEncoding.code_lengths(
+            node=HuffmanEncoding.build_tree(
+                frequency_table=HuffmanEncoding.frequency_table(
+                    image=image,pixel_stride=pixel_stride
+                )
+            )
+        )
+        canonical_codes = HuffmanEncoding.canonical_codes(code_lengths=code_lengths)
+        symbol_codes = zeros(symbols.max()+1,dtype=int64)
+        symbol_lengths = zeros(symbols.max()+1,dtype=int64)
+        for symbol,(code,length) in canonical_codes.items():
+            symbol_codes[symbol] = code
+            symbol_lengths[symbol] = length
 
-        encoded = '' 
-        x,y = image.shape
-        image_flat = image.flatten()
+        codes = symbol_codes[symbols]
+        lengths = symbol_lengths[symbols]
+        starts = cumsum(lengths)-lengths
+        n_bits = int(lengths.sum())
+        bits = zeros(n_bits,dtype=uint8)
+        for position in range(lengths.max()):
+            has_bit = flatnonzero(lengths > position)
+            bits[starts[has_bit]+position] = (
+                codes[has_bit] >> (lengths[has_bit]-1-position)
+            ) & 1
+        return packbits(bits), n_bits, code_lengths
 
-        for index in range(0,x*y,pixel_stride):
-            pattern = ''.join(map(str,image_flat[index:index+pixel_stride]))
-            encoded += huffman_code_to_original[pattern]
+    @staticmethod
+    def decode(
+        code:ndarray,
+        n_bits:int,
+        image_shape:Tuple[int,int],
+        code_lengths:Dict[int,int],
+        pixel_stride:int=3
+    ) -> ndarray:
+        n_pixels = image_shape[0]*image_shape[1]
+        n_symbols = -(-n_pixels//pixel_stride)
+        maximum_length = max(code_lengths.values())
+        if not maximum_length:
+            symbols = full(n_symbols,next(iter(code_lengths)))
+        else:
+            lookup_symbols, lookup_lengths = HuffmanEncoding.lookup_table(
+                code_lengths=code_lengths
+            )
+            bits = concatenate((
+                unpackbits(code,count=n_bits).astype(int64),
+                zeros(maximum_length,dtype=int64)
+            ))
+            windows = zeros(n_bits,dtype=int64)
+            for offset in range(maximum_length):
+                windows = (windows << 1) | bits[offset:offset+n_bits]
+            next_positions = (arange(n_bits)+lookup_lengths[windows]).tolist()
+            positions = list()
+            position = 0
+            while position < n_bits:
+                positions.append(position)
+                position = next_positions[position]
+            symbols = lookup_symbols[windows[positions]]
 
-        return encoded, huffman_code_to_original
+        full_strides = symbols[:n_pixels//pixel_stride]
+        pixels = [(full_strides[:,None] >> arange(pixel_stride-1,-1,-1)) & 1]
+        remainder = n_pixels%pixel_stride
+        if remainder:
+            pixels.append((symbols[-1:,None] >> arange(remainder-1,-1,-1)) & 1)
+        return concatenate([stride.reshape(stride.size) for stride in pixels]).reshape(image_shape)
 
     @staticmethod
-    def decode(code:str, image_shape:Tuple[int,int], huffman_table:Dict[str,str]) -> ndarray:
-        table = dict((value,key) for key,value in huffman_table.items())
-        result = ''
-        while any(code):
-            for pattern,decoded in table.items():
-                if code.startswith(pattern):
-                    result += decoded 
-                    code = code[len(pattern):]
-                    break
-        return array(list(map(int,result))).reshape(image_shape)
+    def symbols(image:ndarray,pixel_stride:int=3) -> ndarray:
+        """
+        one integer per stride of pixels: the stride's bits behind a leading 1
+        (so a shorter final stride is a different symbol from a full one)
+        """
+        flat = image.reshape(image.size).astype(int64)
+        n_full_strides = flat.size//pixel_stride
+        strides = [flat[:n_full_strides*pixel_stride].reshape((n_full_strides,pixel_stride))]
+        if flat.size%pixel_stride:
+            strides.append(flat[n_full_strides*pixel_stride:].reshape((1,-1)))
+        return concatenate([
+            (1 << stride.shape[1]) | (stride << arange(stride.shape[1]-1,-1,-1)).sum(axis=1)
+            for stride in strides
+        ])
 
     @staticmethod
-    def huffman_table(image:ndarray) -> Dict[str,str]:
-        return HuffmanEncoding.encoding_table(
-            node = HuffmanEncoding.build_tree(
-                frequency_table=HuffmanEncoding.frequency_table(
-                    image=image
+    def huffman_table(image:ndarray,pixel_stride:int=3) -> Dict[int,Tuple[int,int]]:
+        return HuffmanEncoding.canonical_codes(
+            code_lengths=HuffmanEncoding.code_lengths(
+                node=HuffmanEncoding.build_tree(
+                    frequency_table=HuffmanEncoding.frequency_table(
+                        image=image,pixel_stride=pixel_stride
+                    )
                 )
-            ) 
+            )
         )
 
     @staticmethod
-    def encoding_table(node:dict, encoded='') -> Dict[str,str]:
-        if not isinstance(node,dict):
-            return {node: encoded}
+    def code_lengths(node:dict) -> Dict[int,int]:
+        lengths = dict()
+        stack = [(node,0)]
+        while stack:
+            node,depth = stack.pop()
+            if not isinstance(node,dict):
+                lengths[node] = depth
+                continue
+            stack.append((node["left"],depth+1))
+            stack.append((node["right"],depth+1))
+        return lengths
 
-        table = dict()
-        table.update(HuffmanEncoding.encoding_table(
-            node=node["left"], 
-            encoded=encoded +'0'
-        ))
-        table.update(HuffmanEncoding.encoding_table(
-            node=node["right"], 
-            encoded=encoded + '1'
-        ))
-        return table
+    @staticmethod
+    def canonical_codes(code_lengths:Dict[int,int]) -> Dict[int,Tuple[int,int]]:
+        """(code, length) of each symbol, assigned in (length, symbol) order"""
+        codes = dict()
+        code = 0
+        previous_length = 0
+        for symbol,length in sorted(code_lengths.items(),key=lambda symbol_length:(symbol_length[1],symbol_length[0])):
+            code <<= length-previous_length
+            codes[symbol] = (code,length)
+            code += 1
+            previous_length = length
+        return codes
 
     @staticmethod
-    def frequency_table(image:ndarray,pixel_stride:int=3) -> List[Tuple[str,int]]:
-        table = dict()
-        x,y = image.shape
-        image_flat = image.flatten()
-        for index in range(0,x*y,pixel_stride):
-            pixels = ''.join(map(str,image_flat[index:index+pixel_stride]))
-            if pixels not in table:
-                table[pixels] = 0
-            table[pixels] += 1
-        return table
- 
+    def lookup_table(code_lengths:Dict[int,int]) -> Tuple[ndarray,ndarray]:
+        """
+        symbol and code length for every window of the longest code length
+        (indexed by the window's bits, which start with exactly one code)
+        """
+        maximum_length = max(code_lengths.values())
+        lookup_symbols = zeros(1 << maximum_length,dtype=int64)
+        lookup_lengths = zeros(1 << maximum_length,dtype=int64)
+        for symbol,(code,length) in HuffmanEncoding.canonical_codes(code_lengths=code_lengths).items():
+            first = code << (maximum_length-length)
+            last = (code+1) << (maximum_length-length)
+            lookup_symbols[first:last] = symbol
+            lookup_lengths[first:last] = length
+        return lookup_symbols, lookup_lengths
+
     @staticmethod
-    def build_tree(frequency_table:Dict[str,int]) -> dict:
-        nodes = sorted(
-            frequency_table.items(), 
-            key=lambda pixels_frequency: pixels_frequency[1], 
-            reverse=True
+    def frequency_table(image:ndarray,pixel_stride:int=3) -> Dict[int,int]:
+        frequencies = bincount(HuffmanEncoding.symbols(image=image,pixel_stride=pixel_stride))
+        return dict(
+            (int(symbol),int(frequencies[symbol])) for symbol in flatnonzero(frequencies)
         )
+
+    @staticmethod
+    def build_tree(frequency_table:Dict[int,int]) -> dict:
+        tiebreak = count()
+        nodes = [
+            (frequency,next(tiebreak),pixels)
+            for pixels,frequency in frequency_table.items()
+        ]
+        heapify(nodes)
         while len(nodes) > 1:
-            pixels1, frequency1 = nodes.pop()
-            pixels2, frequency2 = nodes.pop()
-            nodes.append(
-                (
-                    dict(left=pixels1,right=pixels2), 
-                    frequency1 + frequency2
-                )
-            )
-            nodes.sort(
-                key=lambda pixels_frequency: pixels_frequency[1], 
-                reverse=True
-            )
-        return nodes[0][0]
\ No newline at end of file
+            frequency1,_,pixels1 = heappop(nodes)
+            frequency2,_,pixels2 = heappop(nodes)
+            heappush(nodes,(
+                frequency1 + frequency2,
+                next(tiebreak),
+                dict(left=pixels1,right=pixels2)
+            ))
+        return nodes[0][2]
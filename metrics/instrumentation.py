@@ -0,0 +1,233 @@
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from functools import wraps
+from json import dump
+from os import getpid
+from threading import Lock, get_ident, local
+from time import perf_counter
+from typing import Dict, Iterator, List, Tuple
+
+Labels = Tuple[Tuple[str,object],...]
+"""sorted (label, value) pairs, e.g. (("metric","ZLIB"),("rule",30))"""
+
+class Instrumentation:
+    """
+    opt-in timers and counters: while disabled an instrumented call costs one
+    attribute check, while enabled each span (a timed call) is aggregated into
+    the count, total and maximum time of its (name, labels) and, when tracing,
+    kept as a Chrome trace event (up to max_events)
+
+    spans and counters take the labels (metric, rule, ...) of the thread's
+    enclosing labelled blocks, so nested stages are attributed to the cell
+    being measured, and timers are inclusive of the spans nested within them
+    """
+    def __init__(self, max_events:int=1_000_000) -> None:
+        self.enabled = False
+        self.tracing = False
+        self.max_events = max_events
+        self.lock = Lock()
+        self.local = local()
+        self.reset()
+
+    def enable(self, trace:bool=False) -> None:
+        self.enabled = True
+        self.tracing = trace
+
+    def disable(self) -> None:
+        self.enabled = False
+        self.tracing = False
+
+    def reset(self) -> None:
+        self.timers:Dict[Tuple[str,Labels],List[float]] = dict()
+        self.counters:Dict[Tuple[str,Labels],int] = dict()
+        self.events:List[dict] = list()
+        self.dropped_events = 0
+
+    def labels(self) -> Labels:
+        return getattr(self.local,"labels",())
+
+    def merged_labels(self, labels:dict) -> Labels:
+        outer = self.labels()
+        return tuple(sorted(dict(outer,**labels).items())) if labels else outer
+
+    @contextmanager
+    def labelled(self, **labels) -> Iterator[None]:
+        """spans and counters within the block carry these labels"""
+        if not self.enabled:
+            yield
+            return
+        outer = self.labels()
+        self.local.labels = self.merged_labels(labels)
+        try:
+            yield
+        finally:
+            self.local.labels = outer
+
+    @contextmanager
+    def span(self, name:str, **labels) -> Iterator[None]:
+        """time the block (and give the spans within it these labels)"""
+        if not self.enabled:
+            yield
+            return
+        outer = self.labels()
+        inner = self.local.labels = self.merged_labels(labels)
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            duration = perf_counter()-start
+            self.local.labels = outer
+            self.record(name=name,labels=inner,start=start,duration=duration)
+
+    def record(self, name:str, labels:Labels, start:float, duration:float) -> None:
+        with self.lock:
+            timer = self.timers.setdefault((name,labels),[0,0.0,0.0])
+            timer[0] += 1
+            timer[1] += duration
+            timer[2] = max(timer[2],duration)
+            if not self.tracing:
+                return
+            if len(self.events) >= self.max_events:
+                self.dropped_events += 1
+                return
+            self.events.append(dict(
+                name=name,
+                ph="X",
+                ts=start*1e6,
+                dur=duration*1e6,
+                pid=getpid(),
+                tid=get_ident(),
+                args=dict(labels)
+            ))
+
+    def count(self, name:str, n:int=1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = name,self.merged_labels(labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key,0)+n
+
+    def submit(self, executor:Executor, function:callable, *args) -> Future:
+        """
+        executor.submit(function,*args) on a process pool, with the spans and
+        counters recorded in the worker merged into this process once it completes
+        """
+        if not self.enabled:
+            return executor.submit(function,*args)
+        future = Future()
+        def resolve(source:Future) -> None:
+            if source.exception() is not None:
+                future.set_exception(source.exception())
+                return
+            result,records = source.result()
+            self.merge(records)
+            future.set_result(result)
+        executor.submit(run_instrumented,self.tracing,function,*args).add_done_callback(resolve)
+        return future
+
+    def records(self) -> dict:
+        with self.lock:
+            return dict(
+                timers=self.timers,
+                counters=self.counters,
+                events=self.events,
+                dropped_events=self.dropped_events
+            )
+
+    def merge(self, records:dict) -> None:
+        with self.lock:
+            for key,(count,total,maximum) in records["timers"].items():
+                timer = self.timers.setdefault(key,[0,0.0,0.0])
+                timer[0] += count
+                timer[1] += total
+                timer[2] = max(timer[2],maximum)
+            for key,n in records["counters"].items():
+                self.counters[key] = self.counters.get(key,0)+n
+            room = max(0,self.max_events-len(self.events))
+            self.events.extend(records["events"][:room])
+            self.dropped_events += records["dropped_events"]+max(0,len(records["events"])-room)
+
+    def summary(self, by:Tuple[str,...]=("metric","rule")) -> Dict[str,dict]:
+        """
+        timers (count, total and maximum seconds) and counters
+        aggregated per combination of the given labels (e.g. per metric and rule),
+        keyed by those label values joined with "/", slowest group first
+        """
+        groups = dict()
+        def group(labels:Labels) -> dict:
+            labels = dict(labels)
+            return groups.setdefault(
+                "/".join(str(labels.get(label)) for label in by),
+                dict(timers=dict(),counters=dict())
+            )
+        with self.lock:
+            for (name,labels),(count,total,maximum) in self.timers.items():
+                timer = group(labels)["timers"].setdefault(name,dict(count=0,total_time=0.0,max_time=0.0))
+                timer["count"] += count
+                timer["total_time"] += total
+                timer["max_time"] = max(timer["max_time"],maximum)
+            for (name,labels),n in self.counters.items():
+                counters = group(labels)["counters"]
+                counters[name] = counters.get(name,0)+n
+        return dict(sorted(
+            groups.items(),
+            key=lambda group:max((timer["total_time"] for timer in group[1]["timers"].values()),default=0.0),
+            reverse=True
+        ))
+
+    def export_json(self, filename:str, by:Tuple[str,...]=("metric","rule")) -> None:
+        """the summary grouped by the given labels, and every timer and counter with its labels"""
+        with self.lock:
+            timers = [
+                dict(name=name,labels=dict(labels),count=count,total_time=total,max_time=maximum)
+                for (name,labels),(count,total,maximum) in self.timers.items()
+            ]
+            counters = [
+                dict(name=name,labels=dict(labels),count=n)
+                for (name,labels),n in self.counters.items()
+            ]
+        with open(filename,"w") as instrumentation_file:
+            dump(dict(
+                grouped_by=list(by),
+                summary=self.summary(by=by),
+                timers=timers,
+                counters=counters
+            ), instrumentation_file, indent = 3)
+
+    def export_chrome_trace(self, filename:str) -> None:
+        """the traced spans in Chrome's trace event format (chrome://tracing, Perfetto)"""
+        with self.lock:
+            trace = dict(
+                traceEvents=self.events,
+                displayTimeUnit="ms",
+                otherData=dict(dropped_events=self.dropped_events)
+            )
+        with open(filename,"w") as trace_file:
+            dump(trace, trace_file)
+
+INSTRUMENTATION = Instrumentation()
+"""this process's instrumentation (disabled until enabled)"""
+
+def timed(name:str, **labels) -> callable:
+    """decorator timing every call as a span (with these labels) while instrumentation is enabled"""
+    def decorator(function:callable) -> callable:
+        @wraps(function)
+        def timed_function(*args, **kwargs):
+            if not INSTRUMENTATION.enabled:
+                return function(*args, **kwargs)
+            with INSTRUMENTATION.span(name,**labels):
+                return function(*args, **kwargs)
+        return timed_function
+    return decorator
+
+def call_labelled(labels:dict, function:callable, *args) -> object:
+    """function(*args) with labels (submitted to a thread or process pool)"""
+    with INSTRUMENTATION.labelled(**labels):
+        return function(*args)
+
+def run_instrumented(trace:bool, function:callable, *args) -> Tuple[object,dict]:
+    """function(*args) and the spans and counters it recorded (in a worker process)"""
+    INSTRUMENTATION.reset()
+    INSTRUMENTATION.enable(trace=trace)
+    result = function(*args)
+    return result, INSTRUMENTATION.records()
@@ -0,0 +1,61 @@
+from typing import Optional, Tuple
+from numpy import arange, exp, ones, outer, pi
+
+from metrics.lossless_fourier_compression_metric.utils import R,C
+
+class IncrementalReconstruction:
+    """
+    running inverse 2D-Fourier reconstruction r^ of a spectrum z^
+    that is updated in O(ωT) each time a single coefficient is removed
+    (removing z^[u,v] subtracts one Fourier basis image from r^)
+
+    for a half spectrum, shape is that of the spacetime and weights
+    count the conjugates stored implicitly by each coefficient
+    """
+    def __init__(
+        self,
+        z_hat:C,
+        inverse_F:callable,
+        shape:Optional[Tuple[int,int]]=None,
+        weights:Optional[R]=None,
+        resync_interval:int=64,
+        tolerance:float=1e-9
+    ) -> None:
+        self.z_hat = z_hat
+        self.inverse_F = inverse_F
+        self.resync_interval = resync_interval
+        self.tolerance = tolerance
+        ω,T = z_hat.shape if shape is None else shape
+        self.N = ω*T
+        self.weights = ones(z_hat.shape) if weights is None else weights
+        self.W_ω = exp(2j*pi*outer(arange(ω),arange(ω))/ω)
+        self.W_T = exp(2j*pi*outer(arange(z_hat.shape[1]),arange(T))/T)
+        self.resync()
+
+    def resync(self) -> R:
+        """full inverse transform (removes accumulated drift)"""
+        self.r_hat = self.inverse_F(self.z_hat)
+        self.steps_since_resync = 0
+        return self.r_hat
+
+    def remove(self, u:int, v:int) -> None:
+        """zero z^[u,v] and subtract its basis image from r^"""
+        a = self.weights[u,v]*self.z_hat[u,v]*self.W_ω[u]/self.N
+        b = self.W_T[v]
+        self.z_hat[u,v] = 0
+        self.r_hat -= outer(a.real,b.real)
+        self.r_hat += outer(a.imag,b.imag)
+        self.steps_since_resync += 1
+
+    def reconstruction(self, θ:float) -> R:
+        """
+        current r^, re-synchronised periodically
+        or whenever a pixel lies too close to θ for the
+        incremental value to be trusted when quantising
+        """
+        if self.steps_since_resync and (
+            self.steps_since_resync >= self.resync_interval or
+            abs(self.r_hat-θ).min() <= self.tolerance
+        ):
+            return self.resync()
+        return self.r_hat
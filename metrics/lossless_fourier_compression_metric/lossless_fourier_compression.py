@@ -1,20 +1,44 @@
-from typing import Optional, List
+from typing import Optional, List, Tuple
+from warnings import warn
 
-from scipy.fft import fft2, ifft2
-from numpy import array, count_nonzero, flatnonzero, zeros, ones, inf
+from scipy.fft import fft2, ifft2, rfft2, irfft2
+from numpy import array, arange, count_nonzero, cumsum, empty, flatnonzero, full, ndarray, unravel_index, where, zeros, ones, tile, tri, inf
 from matplotlib.pyplot import figure, show
 
+from metrics.instrumentation import INSTRUMENTATION, timed
 from metrics.lossless_fourier_compression_metric.utils import S,R,C,𝝋
+from metrics.lossless_fourier_compression_metric.incremental_reconstruction import IncrementalReconstruction
 
 class LosslessFourierCompression:
+    SEARCHES = ("exhaustive","incremental","bisect","batched","certified")
+    BACKENDS = ("fft","rfft")
+
     def __init__(
         self,
         spacetime_evolution:S,
         quantisation_threshold:float=0.5,
         optimal_lossless_filter:Optional[𝝋]=None,
+        search:str="exhaustive",
+        backend:str="fft",
+        resync_interval:int=64,
+        tolerance:float=1e-9,
+        batch_size:int=16,
+        workers:Optional[int]=None,
+        verify:bool=False,
         verbose:bool=False
     ) -> None:
+        assert search in self.SEARCHES, f"unknown search '{search}' (expected one of {self.SEARCHES})"
+        assert backend in self.BACKENDS, f"unknown backend '{backend}' (expected one of {self.BACKENDS})"
         self.θ = quantisation_threshold
+        self.search = search
+        self.real = backend == "rfft"
+        self.shape = spacetime_evolution.shape
+        self.weights = self.hermitian_weights(shape=self.shape) if self.real else None
+        self.resync_interval = resync_interval
+        self.tolerance = tolerance
+        self.batch_size = batch_size
+        self.workers = workers
+        self.verify = verify
         self.𝝋_star = self.𝝋_prime_search( 
             s=spacetime_evolution,
         ) if optimal_lossless_filter is None else optimal_lossless_filter
@@ -45,8 +69,8 @@ class LosslessFourierCompression:
         bottom.set_title(f"Kolmogorov Complexity\nK = {self.complexity}",fontsize=9)
         bottom.set_xlabel('Compression Length\nl(z^)')
         bottom.set_ylabel('Reconstruction Loss\nε(s,s^)')
-        bottom.plot(self.losses[::-1])
-        best_compression_length = self.l(self.z_hat)
+        bottom.plot(self.s.size-array(self.probes),self.losses)
+        best_compression_length = self.l(self.z_hat,self.weights)
         best_loss = self.ɛ(self.s,self.s_hat)
         bottom.plot(best_compression_length, best_loss, 'red',marker=(5, 2))
         bottom.text(best_compression_length,best_loss,best_compression_length,rotation=-20,fontsize=8,horizontalalignment='right')
@@ -54,77 +78,441 @@ class LosslessFourierCompression:
 
         show()     
 
+    @timed("C")
     def C(self,s:S) -> C:
         """lossless compression"""
-        self.z = self.F(s)
+        self.z = self.transform(s)
         return self.𝝋_star(self.z)
 
+    @timed("inverse_C")
     def inverse_C(self, z_hat:C) -> S:
         """lossless decompression"""
-        self.r_hat = self.inverse_F(z_hat)
+        self.r_hat = self.inverse_transform(z_hat)
         return self.Q(r=self.r_hat,θ=self.θ)
 
+    @timed("K")
     def K(self, s:S) -> float:
         """Kolmogorov Complexity"""
         self.s = s
         self.z_hat = self.C(self.s)
         self.s_hat = self.inverse_C(self.z_hat)
         assert not self.ɛ(self.s,self.s_hat), "fourier filter is not lossless!"
-        return 1/self.CR(self.z,self.z_hat)
+        return 1/self.CR(self.z,self.z_hat,self.weights)
 
+    @timed("𝝋_prime_search")
     def 𝝋_prime_search(self, s:S) -> 𝝋:
         """
         search for near-optimal lossless filter
         by filtering coefficients in order of magnitude
         (from least influential to most)
         """
+        return dict(
+            exhaustive=self.exhaustive_search,
+            incremental=self.incremental_search,
+            bisect=self.bisect_search,
+            batched=self.batched_search,
+            certified=self.certified_search,
+        )[self.search](s)
+
+    def exhaustive_search(self, s:S) -> 𝝋:
+        """full inverse transform after every removed coefficient"""
         self.losses = list()
-        ω,T=s.shape
-        z_hat = self.F(s).reshape(ω*T)
-        m = ones(ω*T)
+        z_hat = self.transform(s)
+        Ω = z_hat.shape
+        z_hat = z_hat.reshape(z_hat.size)
+        order, partner = self.removal_order(z_hat)
+        self.probes = self.removed_coefficients(order,partner).tolist()
+        m = ones(z_hat.size)
 
-        for index_larger_coefficient in (
-            abs(z_hat.real)+abs(z_hat.imag)        
-        ).argsort():
+        for index_larger_coefficient in order:
             z_hat[index_larger_coefficient]=0
+            z_hat[partner[index_larger_coefficient]]=0
             loss = self.ɛ(
                 s=s, 
-                s_hat=self.inverse_C(z_hat=z_hat.reshape((ω,T)))
+                s_hat=self.inverse_C(z_hat=z_hat.reshape(Ω))
             ) 
             self.losses.append(loss)
             if not loss:
-                m = zeros(ω*T)
+                m = zeros(z_hat.size)
+                m[flatnonzero(z_hat)]=1
+
+        return 𝝋(mask = m.reshape(Ω))
+
+    def incremental_search(self, s:S) -> 𝝋:
+        """
+        same filter and losses as the exhaustive search,
+        but r^ is updated in O(ωT) per removed coefficient
+        (with periodic full inverse transforms to control drift)
+        """
+        self.losses = list()
+        z_hat = self.transform(s)
+        Ω = z_hat.shape
+        order, partner = self.removal_order(z_hat)
+        self.probes = self.removed_coefficients(order,partner).tolist()
+        reconstruction = IncrementalReconstruction(
+            z_hat=z_hat,
+            inverse_F=self.inverse_transform,
+            shape=self.shape,
+            weights=self.weights,
+            resync_interval=self.resync_interval,
+            tolerance=self.tolerance
+        )
+        m = ones(z_hat.size)
+        for index_larger_coefficient in order:
+            reconstruction.remove(*unravel_index(index_larger_coefficient,Ω))
+            if partner[index_larger_coefficient] != index_larger_coefficient:
+                reconstruction.remove(*unravel_index(partner[index_larger_coefficient],Ω))
+            self.r_hat = reconstruction.reconstruction(θ=self.θ)
+            loss = self.ɛ(
+                s=s,
+                s_hat=self.Q(r=self.r_hat,θ=self.θ)
+            )
+            self.losses.append(loss)
+            if not loss:
+                m = zeros(z_hat.size)
                 m[flatnonzero(z_hat)]=1
 
-        return 𝝋(mask = m.reshape((ω,T)))
+        return 𝝋(mask = m.reshape(Ω))
+
+    def bisect_search(self, s:S) -> 𝝋:
+        """
+        longest lossless prefix of the magnitude ordering
+        found by galloping (1,2,4,...) then bisecting,
+        using O(log ωT) inverse transforms
+        (equal to the exhaustive search when the loss curve is monotone)
+        """
+        z = self.transform(s)
+        Ω = z.shape
+        z = z.reshape(z.size)
+        order, partner = self.removal_order(z)
+        n = len(order)
+        probed = dict()
+
+        def loss(n_removed:int) -> float:
+            z_hat = z.copy()
+            z_hat[order[:n_removed]]=0
+            z_hat[partner[order[:n_removed]]]=0
+            probed[n_removed] = self.ɛ(
+                s=s,
+                s_hat=self.inverse_C(z_hat=z_hat.reshape(Ω))
+            )
+            return probed[n_removed]
+
+        lossless,lossy = 0,n+1
+        n_removed = 1
+        while n_removed <= n:
+            if loss(n_removed):
+                lossy = n_removed
+                break
+            lossless = n_removed
+            n_removed *= 2
+        else:
+            if lossless < n:
+                if loss(n):
+                    lossy = n
+                else:
+                    lossless = n
+        while lossy-lossless > 1:
+            n_removed = (lossless+lossy)//2
+            if loss(n_removed):
+                lossy = n_removed
+            else:
+                lossless = n_removed
+
+        removed = self.removed_coefficients(order,partner)
+        self.probes = [removed[n_removed-1] for n_removed in sorted(probed)]
+        self.losses = [probed[n_removed] for n_removed in sorted(probed)]
+        m = ones(z.size)
+        if lossless:
+            z[order[:lossless]]=0
+            z[partner[order[:lossless]]]=0
+            m = zeros(z.size)
+            m[flatnonzero(z)]=1
+        𝝋_fast = 𝝋(mask = m.reshape(Ω))
+        if self.verify:
+            self.verify_monotone(s=s,𝝋_fast=𝝋_fast)
+        return 𝝋_fast
+
+    def batched_search(self, s:S) -> 𝝋:
+        """
+        same filter and losses as the exhaustive search,
+        but the next batch_size candidate filters are stacked (K,ω,T)
+        and inverted, quantised and scored together
+        """
+        self.losses = list()
+        z_hat = self.transform(s)
+        Ω = z_hat.shape
+        z_hat = z_hat.reshape(z_hat.size)
+        order, partner = self.removal_order(z_hat)
+        self.probes = self.removed_coefficients(order,partner).tolist()
+        m = ones(z_hat.size)
+
+        for start in range(0,len(order),self.batch_size):
+            batch = order[start:start+self.batch_size]
+            K = len(batch)
+            candidates = tile(z_hat,(K,1))
+            candidates[:,batch] *= 1-tri(K)
+            candidates[:,partner[batch]] *= 1-tri(K)
+            self.r_hat = self.inverse_transform(candidates.reshape((K,)+Ω))
+            losses = self.ɛ(s=s,s_hat=self.Q(r=self.r_hat,θ=self.θ))
+            self.losses.extend(losses.tolist())
+            z_hat[batch]=0
+            z_hat[partner[batch]]=0
+            lossless = flatnonzero(losses==0)
+            if len(lossless):
+                m = zeros(z_hat.size)
+                m[flatnonzero(candidates[lossless[-1]])]=1
+
+        self.r_hat = self.r_hat[-1]
+        return 𝝋(mask = m.reshape(Ω))
+
+    def certified_search(self, s:S) -> 𝝋:
+        """
+        same filter and losses as the exhaustive search,
+        but the inverse transform (and ɛ) only runs when the coefficients
+        removed since the last one could move a pixel of r^ across θ:
+        no pixel moves by more than the sum of their magnitudes / ωT,
+        so while that bound stays below the smallest margin |r^ - θ|
+        the quantised reconstruction (and its loss) cannot change
+
+        the transforms run and skipped are counted in INSTRUMENTATION
+        (under the cell's metric and rule labels)
+        """
+        self.losses = list()
+        z_hat = self.transform(s)
+        Ω = z_hat.shape
+        z_hat = z_hat.reshape(z_hat.size)
+        order, partner = self.removal_order(z_hat)
+        self.probes = self.removed_coefficients(order,partner).tolist()
+        weights = ones(z_hat.size) if self.weights is None else self.weights.reshape(z_hat.size)
+        perturbations = (
+            weights[order]*abs(z_hat[order]) +
+            where(partner[order]!=order, weights[partner[order]]*abs(z_hat[partner[order]]), 0)
+        )/s.size
+        self.transforms_run = 0
+        self.transforms_skipped = 0
+        bound, margin, loss = inf, 0, None
+        z = z_hat.copy()
+        last_lossless = None
+
+        for step,(index_larger_coefficient,perturbation) in enumerate(zip(order,perturbations)):
+            z_hat[index_larger_coefficient]=0
+            z_hat[partner[index_larger_coefficient]]=0
+            bound += perturbation
+            if bound >= margin-self.tolerance:
+                loss = self.ɛ(
+                    s=s,
+                    s_hat=self.inverse_C(z_hat=z_hat.reshape(Ω))
+                )
+                bound, margin = 0, abs(self.r_hat-self.θ).min()
+                self.transforms_run += 1
+            else:
+                self.transforms_skipped += 1
+            self.losses.append(loss)
+            if not loss:
+                last_lossless = step
+        INSTRUMENTATION.count("transforms_run",n=self.transforms_run)
+        INSTRUMENTATION.count("transforms_skipped",n=self.transforms_skipped)
+
+        m = ones(z.size)
+        if last_lossless is not None:
+            z[order[:last_lossless+1]]=0
+            z[partner[order[:last_lossless+1]]]=0
+            m = zeros(z.size)
+            m[flatnonzero(z)]=1
+        return 𝝋(mask = m.reshape(Ω))
+
+    def removal_order(self, z:C) -> Tuple[ndarray,ndarray]:
+        """
+        flat indices of the coefficients in the order they are filtered
+        (from least to most influential) and the index of each one's
+        conjugate partner, which is filtered together with it
+        (a coefficient is its own partner in the full spectrum)
+        """
+        magnitudes = (abs(z.real)+abs(z.imag)).reshape(z.size)
+        if not self.real:
+            return magnitudes.argsort(), arange(z.size)
+        partner = self.conjugate_partners(shape=self.shape)
+        representatives = flatnonzero(arange(z.size) <= partner)
+        return representatives[magnitudes[representatives].argsort()], partner
+
+    def removed_coefficients(self, order:ndarray, partner:ndarray) -> ndarray:
+        """number of full-spectrum coefficients filtered after each step"""
+        if self.weights is None:
+            return arange(1,len(order)+1)
+        weights = self.weights.reshape(self.weights.size)
+        return cumsum(
+            weights[order] + where(partner[order]!=order, weights[partner[order]], 0)
+        )
+
+    def transform(self, r:R) -> C:
+        """forward transform of the selected backend"""
+        return self.real_F(r) if self.real else self.F(r)
+
+    def inverse_transform(self, z:C) -> R:
+        """inverse transform of the selected backend (over the last two axes)"""
+        return self.inverse_real_F(
+            z,shape=self.shape,workers=self.workers
+        ) if self.real else self.inverse_F(z,workers=self.workers)
+
+    def verify_monotone(self, s:S, 𝝋_fast:𝝋) -> bool:
+        """
+        compute the full loss curve and report (as a warning)
+        when it is not monotone, i.e. when a lossless filter exists
+        beyond the first lossy one and the fast answer may differ
+        """
+        𝝋_exhaustive = self.incremental_search(s)
+        first_lossy = next(
+            (index for index,loss in enumerate(self.losses) if loss),
+            len(self.losses)
+        )
+        late_lossless = [
+            self.probes[index] for index,loss in enumerate(self.losses)
+            if index > first_lossy and not loss
+        ]
+        self.monotone = not late_lossless
+        if not self.monotone:
+            warn(
+                f"loss curve is not monotone: {len(late_lossless)} lossless filters "
+                f"after the first lossy one (at {self.probes[first_lossy]} coefficients removed); "
+                f"fast search {'differs from' if (𝝋_fast.m != 𝝋_exhaustive.m).any() else 'agrees with'} the exhaustive search"
+            )
+        return self.monotone
+
+    @classmethod
+    def batch(
+        cls,
+        stack:ndarray,
+        quantisation_threshold:float=0.5,
+        backend:str="fft",
+        workers:Optional[int]=None
+    ) -> Tuple[ndarray,ndarray]:
+        """
+        complexities (B,) and optimal lossless filter masks (B,ω,T)
+        of a (B,ω,T) stack of same-shaped spacetimes,
+        transformed, searched (exhaustively) and verified together
+        (each mask can be passed back as optimal_lossless_filter=𝝋(mask))
+        """
+        assert backend in cls.BACKENDS, f"unknown backend '{backend}' (expected one of {cls.BACKENDS})"
+        θ = quantisation_threshold
+        B,ω,T = stack.shape
+        real = backend == "rfft"
+        z = cls.real_F(stack) if real else cls.F(stack)
+        Ω = z.shape[1:]
+        z = z.reshape((B,-1))
+        n = z.shape[1]
+        images = arange(B)
+
+        def inverse_transform(z_hat:C) -> R:
+            return cls.inverse_real_F(
+                z_hat.reshape((B,)+Ω),shape=(ω,T),workers=workers
+            ) if real else cls.inverse_F(z_hat.reshape((B,)+Ω),workers=workers)
+
+        magnitudes = abs(z.real)+abs(z.imag)
+        if real:
+            partner = cls.conjugate_partners(shape=(ω,T))
+            weights = cls.hermitian_weights(shape=(ω,T))
+            representatives = flatnonzero(arange(n) <= partner)
+            order = representatives[magnitudes[:,representatives].argsort(axis=1)]
+        else:
+            partner = arange(n)
+            weights = None
+            order = magnitudes.argsort(axis=1)
+
+        z_hat = z.copy()
+        last_lossless = full(B,-1)
+        for step in range(order.shape[1]):
+            z_hat[images,order[:,step]]=0
+            z_hat[images,partner[order[:,step]]]=0
+            losses = cls.ɛ(s=stack,s_hat=cls.Q(r=inverse_transform(z_hat),θ=θ))
+            last_lossless[losses==0] = step
+
+        rank = empty((B,n),dtype=int)
+        rank[images[:,None],order] = arange(order.shape[1])
+        rank[images[:,None],partner[order]] = arange(order.shape[1])
+        masks = (rank > last_lossless[:,None]) & (z != 0)
+        masks[last_lossless < 0] = True
+
+        z_hat = z*masks
+        assert not cls.ɛ(
+            s=stack,
+            s_hat=cls.Q(r=inverse_transform(z_hat),θ=θ)
+        ).any(), "fourier filter is not lossless!"
+        L = cls.l(z_hat.reshape((B,)+Ω),weights)
+        complexities = zeros(B)
+        compressible = L > 0
+        complexities[compressible] = 1/(
+            cls.l(z.reshape((B,)+Ω),weights)[compressible]/L[compressible]
+        )
+        return complexities, masks.reshape((B,)+Ω)
 
     @staticmethod
-    def CR(z:C, z_hat:C) -> float:
+    def CR(z:C, z_hat:C, weights:Optional[R]=None) -> float:
         """Compression Ratio"""
-        L = LosslessFourierCompression.l(z_hat)
+        L = LosslessFourierCompression.l(z_hat,weights)
         return (
-            LosslessFourierCompression.l(z)/L 
+            LosslessFourierCompression.l(z,weights)/L 
         ) if L else inf
 
     @staticmethod
+    @timed("ɛ")
     def ɛ(s:S,s_hat:S) -> float:
-        """reconstruction loss"""
-        return abs(s - s_hat).sum()
+        """reconstruction loss (per image for a stack of reconstructions)"""
+        return abs(s - s_hat).sum(axis=(-2,-1))
 
     @staticmethod
-    def l(z:C) -> int:
-        """compression length"""
-        return count_nonzero(z)
+    def l(z:C, weights:Optional[R]=None) -> int:
+        """
+        compression length (per image for a stack of spectra)
+        (weights count the conjugates a half spectrum stores implicitly)
+        """
+        return count_nonzero(
+            z,axis=(-2,-1)
+        ) if weights is None else (weights*(z!=0)).sum(axis=(-2,-1))
 
     @staticmethod
+    @timed("F")
     def F(r:R) -> C:
         """2D-Fast Fourier Transform"""
         return fft2(r)
 
     @staticmethod
-    def inverse_F(z:C) -> R:
-        """inverse 2D-Fast Fourier Transform"""
-        return ifft2(z).real
+    def inverse_F(z:C, workers:Optional[int]=None) -> R:
+        """inverse 2D-Fast Fourier Transform (over the last two axes)"""
+        return ifft2(z,workers=workers).real
+
+    @staticmethod
+    @timed("real_F")
+    def real_F(r:R) -> C:
+        """2D-Real Fast Fourier Transform (non-redundant half spectrum)"""
+        return rfft2(r)
+
+    @staticmethod
+    def inverse_real_F(z:C, shape:Tuple[int,int], workers:Optional[int]=None) -> R:
+        """inverse 2D-Real Fast Fourier Transform (over the last two axes)"""
+        return irfft2(z,s=shape,workers=workers)
+
+    @staticmethod
+    def hermitian_weights(shape:Tuple[int,int]) -> R:
+        """
+        number of full-spectrum coefficients each half-spectrum coefficient
+        stands for (columns 0 and T/2 hold both members of their conjugate pairs)
+        """
+        _,T = shape
+        weights = 2*ones((shape[0],T//2+1),dtype=int)
+        weights[:,0] = 1
+        if not T%2:
+            weights[:,-1] = 1
+        return weights
+
+    @staticmethod
+    def conjugate_partners(shape:Tuple[int,int]) -> ndarray:
+        """flat index of the conjugate of each half-spectrum coefficient"""
+        ω,T = shape
+        H = T//2+1
+        u,v = unravel_index(arange(ω*H),(ω,H))
+        self_paired = (v==0) | ((v==T//2) & (T%2==0))
+        return where(self_paired, ((-u)%ω)*H+v, arange(ω*H))
 
     @staticmethod
     def Q(r:R,θ:float) -> S:
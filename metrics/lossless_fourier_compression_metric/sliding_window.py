@@ -0,0 +1,131 @@
+from typing import Optional
+from scipy.fft import fft, fft2
+from numpy import arange, complex128, count_nonzero, exp, ndarray, ones, pi, roll, uint8, where, zeros
+
+from metrics.lossless_fourier_compression_metric.lossless_fourier_compression import LosslessFourierCompression
+from metrics.lossless_fourier_compression_metric.utils import C,S
+
+class SlidingFourierSpectrum:
+    """
+    2D-Fourier spectrum of the last window rows of a stream of rows,
+    updated in O(window·width) per row instead of transformed from scratch:
+    with X_t the 1D transform of row t (over its columns), the spectrum of rows
+    t..t+window-1 is Z_t[k,v] = Σ_r X_{t+r}[v] e^{-2πikr/window}, so
+    Z_{t+1}[k,v] = e^{2πik/window} (Z_t[k,v] - X_t[v] + X_{t+window}[v])
+
+    only the window's rows and their 1D transforms are held (in ring buffers),
+    and the spectrum is transformed in full every resync_interval rows
+    to remove accumulated drift (the drift that remains is snapped away
+    from the coefficients that vanish, see spectrum)
+    """
+    def __init__(self, width:int, window:int, resync_interval:int=256) -> None:
+        self.width = width
+        self.window = window
+        self.resync_interval = resync_interval
+        self.rows = zeros((window,width),dtype=uint8)
+        self.row_spectra = zeros((window,width),dtype=complex128)
+        self.twiddles = exp(2j*pi*arange(window)/window)[:,None]
+        self.z:Optional[C] = None
+        self.n_rows = 0
+        self.updates_since_resync = 0
+
+    @property
+    def full(self) -> bool:
+        return self.n_rows >= self.window
+
+    def push(self, row:ndarray) -> None:
+        """slide the window forward by one row"""
+        assert row.shape == (self.width,), f"rows must have {self.width} cells"
+        oldest = self.n_rows%self.window
+        row_spectrum = fft(row)
+        if self.z is not None:
+            self.z -= self.row_spectra[oldest]
+            self.z += row_spectrum
+            self.z *= self.twiddles
+            self.updates_since_resync += 1
+        self.rows[oldest] = row
+        self.row_spectra[oldest] = row_spectrum
+        self.n_rows += 1
+        if self.full and (self.z is None or self.updates_since_resync >= self.resync_interval):
+            self.resync()
+
+    def resync(self) -> C:
+        """full 2D transform of the window"""
+        self.z = fft2(self.spacetime())
+        self.updates_since_resync = 0
+        return self.z
+
+    def spectrum(self, tolerance:float=1e-9) -> C:
+        """
+        the window's spectrum with coefficients below tolerance·(window·width)
+        (rounding noise left where a coefficient vanishes) set to exactly 0
+        """
+        return where(abs(self.z) < tolerance*self.z.size, 0, self.z)
+
+    def spacetime(self) -> S:
+        """the window's rows, oldest first"""
+        return roll(self.rows,-(self.n_rows%self.window),axis=0)
+
+class SlidingFourierCompression:
+    """
+    LosslessFourierCompression complexity of consecutive windows of a stream,
+    with each window's filter search warm-started from the previous window's
+    filter: the number of coefficients the previous optimal filter removed is
+    probed first, then the boundary between lossless and lossy filters is found
+    by galloping away from it and bisecting (as in the bisect search),
+    so a window similar to the last costs a handful of inverse transforms
+
+    the filter found is the exhaustive search's only when the loss curve is
+    monotone (otherwise, as with the bisect search, a lossless filter at a
+    boundary near the previous window's is kept, and the complexity can
+    differ from LosslessFourierCompression's)
+    """
+    def __init__(self, quantisation_threshold:float=0.5) -> None:
+        self.θ = quantisation_threshold
+        self.n_removed = 0
+
+    def complexity(self, s:S, z:C) -> float:
+        """complexity of a window s given its spectrum z (e.g. SlidingFourierSpectrum.spectrum())"""
+        order = (abs(z.real)+abs(z.imag)).reshape(z.size).argsort()
+        n = len(order)
+
+        def filtered(n_removed:int) -> C:
+            z_hat = z.reshape(z.size).copy()
+            z_hat[order[:n_removed]] = 0
+            return z_hat.reshape(z.shape)
+
+        def lossless(n_removed:int) -> bool:
+            return not n_removed or not LosslessFourierCompression.ɛ(
+                s=s,
+                s_hat=LosslessFourierCompression.Q(
+                    r=LosslessFourierCompression.inverse_F(filtered(n_removed)),
+                    θ=self.θ
+                )
+            )
+
+        start = min(self.n_removed,n)
+        step = 1
+        if lossless(start):
+            lower = start
+            while lower+step <= n and lossless(lower+step):
+                lower += step
+                step *= 2
+            upper = min(lower+step,n+1)
+        else:
+            upper = start
+            while upper-step > 0 and not lossless(upper-step):
+                upper -= step
+                step *= 2
+            lower = max(upper-step,0)
+        while upper-lower > 1:
+            middle = (lower+upper)//2
+            if lossless(middle):
+                lower = middle
+            else:
+                upper = middle
+
+        assert lossless(lower), "fourier filter is not lossless!"
+        self.n_removed = lower
+        m = filtered(lower) != 0 if lower else ones(z.shape,dtype=bool)
+        L = count_nonzero(z*m)
+        return float(L/count_nonzero(z)) if L else 0.0
@@ -0,0 +1,87 @@
+from hashlib import blake2b
+from json import dump, dumps, load
+from os import makedirs, replace, remove, scandir, utime, getpid
+from os.path import join, exists
+from threading import Lock, get_ident
+from typing import Dict, Optional, Tuple
+from numpy import ndarray
+
+class ResultCache:
+    """
+    content-addressed on-disk cache of metric results:
+    one small file per (spacetime content, metric, metric parameters) cell,
+    written atomically and evicted least-recently-used beyond max_entries
+
+    values of derivable_metrics are keyed by how they were obtained too
+    (searched, or derived from a symmetry variant's filter), since the two
+    can differ and a run that only searches must never read a derived value
+    """
+    def __init__(self, path:str, metric_parameters:Dict[str,dict], max_entries:int=1_000_000, derivable_metrics:Tuple[str,...]=()) -> None:
+        self.path = path
+        self.metric_parameters = metric_parameters
+        self.derivable_metrics = derivable_metrics
+        self.max_entries = max_entries
+        self.lock = Lock()
+        makedirs(path, exist_ok=True)
+        self.n_entries = len(self.entries())
+
+    @staticmethod
+    def content_key(s:ndarray) -> str:
+        """hash of an array's content, shape and dtype"""
+        return blake2b(
+            s.tobytes()+str(s.shape).encode()+s.dtype.str.encode(),
+            digest_size=16
+        ).hexdigest()
+
+    def key(self, content_key:str, metric_name:str, derived:bool=False) -> str:
+        cell = [content_key,metric_name,self.metric_parameters.get(metric_name)]
+        if metric_name in self.derivable_metrics:
+            cell.append("derived" if derived else "searched")
+        return blake2b(
+            dumps(cell,sort_keys=True).encode(),
+            digest_size=16
+        ).hexdigest()
+
+    def filename(self, key:str) -> str:
+        return join(self.path,key[:2],f"{key}.json")
+
+    def get(self, key:str) -> Optional[float]:
+        filename = self.filename(key)
+        try:
+            with open(filename) as cache_file:
+                value = load(cache_file)["value"]
+            utime(filename)
+            return value
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+    def put(self, key:str, metric_name:str, value:float) -> None:
+        filename = self.filename(key)
+        makedirs(join(self.path,key[:2]), exist_ok=True)
+        temporary_filename = f"{filename}.{getpid()}.{get_ident()}.tmp"
+        with open(temporary_filename,"w") as cache_file:
+            dump(dict(metric=metric_name,value=float(value)), cache_file)
+        new_entry = not exists(filename)
+        replace(temporary_filename, filename)
+        with self.lock:
+            self.n_entries += new_entry
+            if self.n_entries > self.max_entries:
+                self.evict()
+
+    def entries(self) -> list:
+        return [
+            entry
+            for directory in scandir(self.path) if directory.is_dir()
+            for entry in scandir(directory.path) if entry.name.endswith(".json")
+        ]
+
+    def evict(self) -> None:
+        """remove the least recently used entries down to 90% of max_entries"""
+        entries = sorted(self.entries(),key=lambda entry:entry.stat().st_mtime)
+        n_evicted = max(0,len(entries)-int(0.9*self.max_entries))
+        for entry in entries[:n_evicted]:
+            try:
+                remove(entry.path)
+            except FileNotFoundError:
+                pass
+        self.n_entries = len(entries)-n_evicted
@@ -1,38 +1,56 @@
-from typing import Generator, Tuple, List
-from numpy import ndarray, array
+from typing import Tuple, Union
+from numpy import ndarray, append, bincount, cumsum, diff, flatnonzero, full, repeat, zeros
 
 class RunLengthEncoding:
+    MAXIMUM_RUN_LENGTH = 2**8
+
+    @staticmethod
+    def compression_ratio(image:ndarray) -> Union[float,ndarray]:
+        x,y = image.shape[-2:]
+        return (x*y)/RunLengthEncoding.run_counts(image)
+
+    @staticmethod
+    def encode(image:ndarray) -> Tuple[ndarray,ndarray]:
+        """
+        (values, lengths) of the runs in the flattened image
+        (or stack of images, whose runs never span two images),
+        runs longer than the maximum run length are split
+        """
+        maximum_run_length = RunLengthEncoding.MAXIMUM_RUN_LENGTH
+        flat = image.reshape(image.size)
+        starts,run_lengths,splits = RunLengthEncoding.runs(image)
+        values = repeat(flat[starts],splits)
+        lengths = full(splits.sum(),maximum_run_length)
+        lengths[cumsum(splits)-1] = run_lengths-maximum_run_length*(splits-1)
+        return values,lengths
+
     @staticmethod
-    def compression_ratio(image:ndarray) -> float:
-        x,y = image.shape
-        return (x*y)/len(list(RunLengthEncoding.encode(image)))
+    def decode(encoded:Tuple[ndarray,ndarray], shape:Tuple[int,...]) -> ndarray:
+        values,lengths = encoded
+        return repeat(values,lengths).reshape(shape)
 
     @staticmethod
-    def encode(image:ndarray) -> Generator[Tuple[int,int],None,None]:
-        maximum_run_length = 2**8
-        count = 0
-        previous_pixel = None
-        for pixel in image.flatten():
-            if previous_pixel is None:
-                previous_pixel=pixel
-                count += 1
-                continue
-            if previous_pixel!=pixel:
-                yield previous_pixel,count
-                previous_pixel=pixel
-                count=1
-                continue
-            if count<maximum_run_length:
-                count+=1
-                continue
-            yield previous_pixel,count 
-            previous_pixel=pixel
-            count=1
-        yield previous_pixel,count 
+    def run_counts(image:ndarray) -> Union[int,ndarray]:
+        """number of encoded runs per image"""
+        x,y = image.shape[-2:]
+        starts,_,splits = RunLengthEncoding.runs(image)
+        if image.ndim == 2:
+            return int(splits.sum())
+        return bincount(
+            starts//(x*y),weights=splits,minlength=image.size//(x*y)
+        ).astype(int).reshape(image.shape[:-2])
 
     @staticmethod
-    def decode(encoded:List[Tuple[int,int]], shape:Tuple[int,int]) -> ndarray:
-        decoded=list()
-        for pattern,count in encoded:
-            decoded.extend([pattern]*count)
-        return array(decoded).reshape(shape)
\ No newline at end of file
+    def runs(image:ndarray) -> Tuple[ndarray,ndarray,ndarray]:
+        """
+        flat index at which each run starts, its length
+        and the number of encoded runs it is split into
+        """
+        x,y = image.shape[-2:]
+        flat = image.reshape(image.size)
+        is_start = zeros(image.size,dtype=bool)
+        is_start[1:] = flat[1:] != flat[:-1]
+        is_start[::x*y] = True
+        starts = flatnonzero(is_start)
+        run_lengths = diff(append(starts,image.size))
+        return starts,run_lengths,-(-run_lengths//RunLengthEncoding.MAXIMUM_RUN_LENGTH)
@@ -0,0 +1,32 @@
+from numpy import ndarray, frombuffer, packbits, unpackbits, prod, uint8
+from typing import Tuple
+
+class ByteSerialisation:
+    """
+    compressor input for binary (0/1) images:
+    one ASCII digit per pixel (identical to ''.join(map(str,image.flatten())).encode())
+    or, when packed, one bit per pixel
+    """
+    ASCII_ZERO = 48
+
+    @staticmethod
+    def serialise(image:ndarray, packed:bool=False) -> bytes:
+        """
+        the compressors' input (serialise once and pass it to each compressor's
+        compression_ratio as data to share it between them)
+        """
+        return packbits(
+            image.flatten().astype(uint8)
+        ).tobytes() if packed else (
+            image.flatten()+ByteSerialisation.ASCII_ZERO
+        ).astype(uint8).tobytes()
+
+    @staticmethod
+    def deserialise(data:bytes, image_shape:Tuple[int,int], packed:bool=False) -> ndarray:
+        return (
+            unpackbits(
+                frombuffer(data,dtype=uint8),count=int(prod(image_shape))
+            ) if packed else frombuffer(
+                data,dtype=uint8
+            )-ByteSerialisation.ASCII_ZERO
+        ).astype(int).reshape(image_shape)
@@ -0,0 +1,130 @@
+from hashlib import blake2b
+from itertools import product
+from typing import Dict, Optional, Tuple
+from numpy import ndarray, ascontiguousarray, roll, flip, uint8
+
+from metrics.instrumentation import timed
+from metrics.lossless_fourier_compression_metric import LosslessFourierCompression
+from metrics.lossless_fourier_compression_metric.utils import 𝝋
+
+Symmetry = Tuple[bool,bool,bool,bool]
+"""(transpose, flip rows, flip columns, invert) applied in that order"""
+
+IDENTITY = (False,False,False,False)
+INVERSION_GROUP = (IDENTITY,(False,False,False,True))
+D4_INVERSION_GROUP = tuple(product((False,True),repeat=4))
+
+def apply_symmetry(s:ndarray, g:Symmetry) -> ndarray:
+    transpose,flip_rows,flip_columns,invert = g
+    s = s.T if transpose else s
+    s = s[::-1] if flip_rows else s
+    s = s[:,::-1] if flip_columns else s
+    return 1-s if invert else s
+
+def negate_frequencies(m:ndarray, axis:int) -> ndarray:
+    """m[-k mod n] along an axis (a spatial flip only changes the phase of z[-k])"""
+    return roll(flip(m,axis=axis),1,axis=axis)
+
+def apply_symmetry_to_filter(m:ndarray, g:Symmetry) -> ndarray:
+    """full-spectrum filter of apply_symmetry(s,g) given the filter of s"""
+    transpose,flip_rows,flip_columns,_ = g
+    m = m.T if transpose else m
+    m = negate_frequencies(m,axis=0) if flip_rows else m
+    return negate_frequencies(m,axis=1) if flip_columns else m
+
+def undo_symmetry_on_filter(m:ndarray, g:Symmetry) -> ndarray:
+    transpose,flip_rows,flip_columns,_ = g
+    m = negate_frequencies(m,axis=1) if flip_columns else m
+    m = negate_frequencies(m,axis=0) if flip_rows else m
+    return m.T if transpose else m
+
+class SymmetryCache:
+    """
+    lets the D4/inversion variants of a spacetime share work,
+    keyed by hashes of the spacetime's 16 variants (computed once):
+    metrics declared invariant under a group of symmetries are cached by
+    the canonical (smallest) hash over that group, all other metrics are
+    cached by content
+
+    derivable metrics (opt-in, e.g. SYMMETRY_DERIVABLE_METRICS) are searched
+    once per orbit and their filter is permuted onto every other variant
+    (a lossless filter, but not always the one the greedy search finds on
+    the variant itself, so derived values can differ from searched ones)
+    """
+    def __init__(
+        self,
+        invariances:Dict[str,Tuple[Symmetry,...]],
+        derivable:Tuple[str,...]=(),
+        quantisation_threshold:float=0.5
+    ) -> None:
+        self.invariances = invariances
+        self.derivable = derivable
+        self.θ = quantisation_threshold
+        self.values = dict()
+        self.filters = dict()
+
+    @staticmethod
+    def variant_hashes(s:ndarray) -> Dict[Symmetry,str]:
+        return dict(
+            (g,SymmetryCache.content_hash(apply_symmetry(s,g)))
+            for g in D4_INVERSION_GROUP
+        )
+
+    @staticmethod
+    def content_hash(s:ndarray) -> str:
+        return blake2b(
+            ascontiguousarray(s,dtype=uint8).tobytes()+str(s.shape).encode(),
+            digest_size=16
+        ).hexdigest()
+
+    @staticmethod
+    def canonical(hashes:Dict[Symmetry,str], group:Tuple[Symmetry,...]) -> Tuple[str,Symmetry]:
+        """canonical key of the orbit and the symmetry taking s to its representative"""
+        return min((hashes[g],g) for g in group)
+
+    def key(self, hashes:Dict[Symmetry,str], metric_name:str) -> Tuple[str,str]:
+        key,_ = self.canonical(
+            hashes=hashes,
+            group=self.invariances.get(metric_name,(IDENTITY,))
+        )
+        return metric_name,key
+
+    def orbit_key(self, hashes:Dict[Symmetry,str]) -> str:
+        key,_ = self.canonical(hashes=hashes,group=D4_INVERSION_GROUP)
+        return key
+
+    def store_filter(self, hashes:Dict[Symmetry,str], m:ndarray) -> None:
+        key,g = self.canonical(hashes=hashes,group=D4_INVERSION_GROUP)
+        self.filters[key] = apply_symmetry_to_filter(m=m,g=g)
+
+    def has_filter(self, hashes:Dict[Symmetry,str]) -> bool:
+        return self.orbit_key(hashes=hashes) in self.filters
+
+    def variant_filter(self, hashes:Dict[Symmetry,str]) -> ndarray:
+        """the orbit's cached filter permuted onto s"""
+        key,g = self.canonical(hashes=hashes,group=D4_INVERSION_GROUP)
+        return undo_symmetry_on_filter(m=self.filters[key],g=g)
+
+    def derived_complexity(self, s:ndarray, hashes:Dict[Symmetry,str]) -> Optional[float]:
+        """
+        Fourier complexity of s from the cached filter of its orbit
+        (None if the permuted filter is not lossless for s,
+        e.g. when inversion moves a pixel onto θ)
+        """
+        return SymmetryCache.filtered_complexity(s=s,m=self.variant_filter(hashes=hashes),θ=self.θ)
+
+    @staticmethod
+    @timed("filtered_complexity")
+    def filtered_complexity(s:ndarray, m:ndarray, θ:float) -> Optional[float]:
+        """Fourier complexity of s under filter m (None if m is not lossless for s)"""
+        s_hat = LosslessFourierCompression.Q(
+            r=LosslessFourierCompression.inverse_F(LosslessFourierCompression.F(s)*m),
+            θ=θ
+        )
+        if LosslessFourierCompression.ɛ(s=s,s_hat=s_hat):
+            return None
+        return LosslessFourierCompression(
+            spacetime_evolution=s,
+            quantisation_threshold=θ,
+            optimal_lossless_filter=𝝋(mask=m)
+        ).complexity
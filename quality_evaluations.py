@@ -1,14 +1,24 @@
+from argparse import ArgumentParser
 from typing import Dict, List
-from pandas import DataFrame
+from re import compile
+from os.path import exists
+from pandas import DataFrame, MultiIndex, Series
 from json import load, dump
 from numpy import corrcoef
 
+from metrics.instrumentation import timed
+from results_store import ResultsStore
+
 class QualityEvaluations:
-    def __init__(self, results_path:str) -> None:
+    SOURCES = ("json","store")
+
+    def __init__(self, results_path:str, source:str="json") -> None:
+        assert source in QualityEvaluations.SOURCES, f"source must be one of {QualityEvaluations.SOURCES}"
         self.results_path = results_path
+        self.source = source
 
     def run_all(self) -> None:
-        complexities = self.load_complexities(results_path=self.results_path)
+        complexities = self.indexed(self.load_complexities(results_path=self.results_path,source=self.source))
 
         correlation_results = self.pearson_correlation(complexities=complexities)
         with open(f"{self.results_path}/pearsons_correlations.json","w") as results_file:
@@ -27,15 +37,54 @@ class QualityEvaluations:
             dump(qualitative_results, results_file, indent = 3)
 
     @staticmethod
-    def load_complexities(results_path) -> DataFrame:
+    @timed("load_complexities")
+    def load_complexities(results_path:str, source:str="json") -> DataFrame:
+        """
+        complexities.json, or the latest completed run of the results store
+        complexities.sqlite (failing when there is none, never falling back)
+        """
+        if source == "store":
+            assert exists(f"{results_path}/complexities.sqlite"), f"no results store in {results_path}"
+            results_store = ResultsStore(f"{results_path}/complexities.sqlite")
+            complexities = results_store.complexities()
+            results_store.close()
+            return complexities
         with open(f"{results_path}/complexities.json") as results_file:
             results = load(results_file)
         return DataFrame(results).T
 
     @staticmethod
+    @timed("indexed")
+    def indexed(complexities:DataFrame) -> DataFrame:
+        """
+        complexities indexed by (rule, ic, symmetry, filename), parsed once from the filenames
+        (spacetimes without a rule, such as minimum_complexity, take their name as symmetry)
+        """
+        if isinstance(complexities.index,MultiIndex):
+            return complexities
+        filenames = complexities.index.to_list()
+        key_pattern = compile(r"(?:^|/)(?:rule(\d+)_ic(\d+)_)?([^/]+?)(?:\.npy)?$")
+        rules,ics,symmetries = zip(*(key_pattern.search(filename).groups() for filename in filenames)) if filenames else ((),(),())
+        return complexities.set_axis(MultiIndex.from_arrays(
+            [
+                Series([None if rule is None else int(rule) for rule in rules],dtype="Int64"),
+                Series([None if ic is None else int(ic) for ic in ics],dtype="Int64"),
+                symmetries,
+                filenames
+            ],
+            names=["rule","ic","symmetry","filename"]
+        ))
+
+    @staticmethod
+    @timed("randomly_sampling_different_complexities")
     def randomly_sampling_different_complexities(complexities:DataFrame, n_samples:int=10) -> Dict[str,List[str]]:
-        complexities_identities = complexities[complexities.index.str.contains("identity") | complexities.index.str.contains("maximum")]
-        fourier_complexities = complexities_identities['LosslessFourierCompression']
+        complexities = QualityEvaluations.indexed(complexities)
+        symmetries = complexities.index.get_level_values("symmetry")
+        complexities_identities = complexities[symmetries.isin(("identity","maximum_complexity"))]
+        fourier_complexities = Series(
+            complexities_identities['LosslessFourierCompression'].to_numpy(),
+            index=complexities_identities.index.get_level_values("filename")
+        )
         results = dict()
         for desired_complexity in range(n_samples):
             desired_complexity /= n_samples
@@ -46,6 +95,7 @@ class QualityEvaluations:
         return results
 
     @staticmethod
+    @timed("pearson_correlation")
     def pearson_correlation(complexities:DataFrame) -> Dict[str,float]:
         correlations = corrcoef(list(map(
             lambda metric_name:complexities[metric_name].tolist(),
@@ -54,50 +104,87 @@ class QualityEvaluations:
         return dict(zip(list(complexities),correlations[0]))
 
     @staticmethod
+    @timed("symmetry_equivalence")
     def symmetry_equivalence(complexities:DataFrame) -> Dict[int,Dict[str,Dict[str,float]]]:
-        SYMMETRIES = ("identity","inversion","rotation","reflection","total")
+        """
+        each metric's differences between every spacetime of a rule and the identity
+        spacetime of its initial condition, relative to the metric's maximum,
+        with their absolute sum per rule and the per-symmetry sums averaged over rules
+        """
+        SYMMETRIES = ("identity","inversion","rotation","reflection")
+        complexities = QualityEvaluations.indexed(complexities)
+        rule_complexities = complexities[complexities.index.get_level_values("rule").notna()]
+        rule_ics = rule_complexities.index.droplevel(["symmetry","filename"])
+        identity_complexities = rule_complexities[
+            rule_complexities.index.get_level_values("symmetry") == "identity"
+        ].droplevel(["symmetry","filename"])
+        identity_complexities = identity_complexities[
+            ~identity_complexities.index.duplicated()
+        ].reindex(rule_ics).set_axis(rule_complexities.index)
+        differences = (identity_complexities-rule_complexities)/complexities.max()
+        absolute_differences = differences.abs()
+        rule_totals = absolute_differences.groupby(level="rule",sort=False).sum()
+        n_rules = len(rule_totals)
+
         results = dict()
-        totals = dict()
-        for rule_number in range(256):
-            rule = f"rule{rule_number}_"
-            results[rule] = dict()
-            rule_complexities = complexities[complexities.index.str.contains(rule)]
-            identity_rule_complexities = complexities[complexities.index.str.contains(rule) & complexities.index.str.contains("identity")]
-            for metric_name in complexities:
-                max_complexity = complexities[metric_name].max()
-                rule_complexity_differences = identity_rule_complexities[metric_name][0] - rule_complexities[metric_name]
-                rule_complexity_differences /= max_complexity
-                rule_complexity_differences = rule_complexity_differences.to_dict()
-                total = sum(map(abs,rule_complexity_differences.values()))
-                if metric_name not in totals:
-                    totals[metric_name] = dict(map(lambda symmetry_name:(symmetry_name,0),SYMMETRIES))
-                for key,value in rule_complexity_differences.items():
-                    for symmetry_name in SYMMETRIES:
-                        if symmetry_name in key:
-                            totals[metric_name][symmetry_name] += abs(value)
-                totals[metric_name]["total"] += total
-                rule_complexity_differences["total"] = total
-                results[rule][metric_name] = rule_complexity_differences        
-        n_rules = len(results)
-        for metric in totals:
-            for total in totals[metric]:
-                totals[metric][total] /= n_rules
-        results['averages'] = totals
+        filenames = differences.index.get_level_values("filename").to_numpy()
+        values = differences.to_numpy()
+        metric_names = list(complexities)
+        for rule_number,positions in sorted(differences.groupby(level="rule").indices.items()):
+            rule_filenames = filenames[positions].tolist()
+            results[f"rule{rule_number}_"] = dict(
+                (metric_name,dict(
+                    list(zip(rule_filenames,metric_differences))+[("total",total)]
+                ))
+                for metric_name,metric_differences,total in zip(
+                    metric_names,values[positions].T.tolist(),rule_totals.loc[rule_number].tolist()
+                )
+            )
+        symmetry_totals = absolute_differences.groupby(
+            level="symmetry"
+        ).sum().reindex(SYMMETRIES,fill_value=0.0)/n_rules
+        overall_totals = rule_totals.sum()/n_rules
+        results['averages'] = dict(
+            (metric_name,dict(
+                [(symmetry_name,float(symmetry_totals.at[symmetry_name,metric_name])) for symmetry_name in SYMMETRIES]
+                +[("total",float(overall_totals[metric_name]))]
+            ))
+            for metric_name in complexities
+        )
         return results 
         
     @staticmethod
+    @timed("within_limits")
     def within_limits(complexities:DataFrame) -> Dict[str,Dict[str,Dict[str,float]]]:
+        complexities = QualityEvaluations.indexed(complexities)
+        symmetries = complexities.index.get_level_values("symmetry")
+        filenames = complexities.index.get_level_values("filename")
+        min_complexities = complexities[symmetries == "minimum_complexity"].iloc[0]
+        max_complexities = complexities[symmetries == "maximum_complexity"].iloc[0]
+        too_small = complexities.lt(min_complexities)
+        too_large = complexities.gt(max_complexities)
         results = dict()
         for metric_name in complexities:
-            metric_complexities = complexities[metric_name]
-            min_complexity = metric_complexities[metric_complexities.index.str.contains("minimum_complexity")].tolist()[0]
-            max_complexity = metric_complexities[metric_complexities.index.str.contains("maximum_complexity")].tolist()[0]
+            metric_complexities = complexities[metric_name].to_numpy()
             results[metric_name] = dict(
-                limits = dict(min_complexity=min_complexity,max_complexity=max_complexity),
-                too_small=metric_complexities[metric_complexities<min_complexity].to_dict(),
-                too_large=metric_complexities[metric_complexities>max_complexity].to_dict()
+                limits = dict(
+                    min_complexity=float(min_complexities[metric_name]),
+                    max_complexity=float(max_complexities[metric_name])
+                ),
+                too_small=dict(zip(
+                    filenames[too_small[metric_name].to_numpy()],
+                    metric_complexities[too_small[metric_name].to_numpy()].tolist()
+                )),
+                too_large=dict(zip(
+                    filenames[too_large[metric_name].to_numpy()],
+                    metric_complexities[too_large[metric_name].to_numpy()].tolist()
+                ))
             )
         return results
 
 
-QualityEvaluations(results_path="results").run_all()
+if __name__ == "__main__":
+    parser = ArgumentParser(description="evaluate the quality of the measured complexities in results")
+    parser.add_argument("--source",choices=QualityEvaluations.SOURCES,default="json",help="read results/complexities.json or the latest completed run of results/complexities.sqlite")
+    arguments = parser.parse_args()
+    QualityEvaluations(results_path="results",source=arguments.source).run_all()
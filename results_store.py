@@ -0,0 +1,133 @@
+from json import dump
+from os.path import basename, splitext
+from sqlite3 import connect
+from threading import Lock
+from typing import Dict, Optional
+from pandas import DataFrame, Series
+
+from spacetime_dataset import SpacetimeDataset
+
+class ResultsStore:
+    """
+    append-only SQLite table of measured complexities, one row per
+    (spacetime, metric) cell with the spacetime's key parsed into rule, ic
+    and symmetry columns: every measurement run appends its cells as they
+    complete (from any thread, or from other processes through SQLite's
+    write-ahead log), marks the run completed once every cell is in, and
+    evaluations read the latest completed run's columns back, in the run's
+    spacetime and metric order (an interrupted run is never read by default)
+    """
+    COLUMNS = ("run","spacetime_index","filename","rule","ic","symmetry","metric_index","metric","value")
+
+    def __init__(self, path:str) -> None:
+        self.path = path
+        self.run = None
+        self.lock = Lock()
+        self.connection = connect(path,timeout=60,check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS runs (run INTEGER PRIMARY KEY AUTOINCREMENT, started TEXT DEFAULT CURRENT_TIMESTAMP, completed TEXT)"
+            )
+            if "completed" not in [column for _,column,*_ in self.connection.execute("PRAGMA table_info(runs)")]:
+                self.connection.execute("ALTER TABLE runs ADD COLUMN completed TEXT")
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS complexities (
+                run INTEGER,
+                spacetime_index INTEGER,
+                filename TEXT,
+                rule INTEGER,
+                ic INTEGER,
+                symmetry TEXT,
+                metric_index INTEGER,
+                metric TEXT,
+                value REAL
+            )""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS complexities_by_run ON complexities (run, metric)")
+
+    def start_run(self) -> int:
+        """the id that this store's appends are recorded under (unique across processes)"""
+        with self.lock, self.connection:
+            self.run = self.connection.execute("INSERT INTO runs DEFAULT VALUES").lastrowid
+        return self.run
+
+    def finish_run(self) -> None:
+        """mark this store's run completed (every one of its cells is appended)"""
+        assert self.run is not None, "start_run before finishing it"
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE runs SET completed = CURRENT_TIMESTAMP WHERE run = ?",(self.run,))
+
+    def latest_run(self) -> Optional[int]:
+        """the latest completed run, if any"""
+        with self.lock:
+            run, = self.connection.execute("SELECT MAX(run) FROM runs WHERE completed IS NOT NULL").fetchone()
+        return run
+
+    def append(self, filename:str, metric_name:str, value:Optional[float], spacetime_index:int, metric_index:int) -> None:
+        assert self.run is not None, "start_run before appending"
+        rule,ic,symmetry = SpacetimeDataset.parse_key(splitext(basename(filename))[0])
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO complexities VALUES (?,?,?,?,?,?,?,?,?)",
+                (self.run,spacetime_index,filename,rule,ic,symmetry,metric_index,metric_name,None if value is None else float(value))
+            )
+
+    def append_results(self, data_results:Dict[str,Dict[str,float]]) -> int:
+        """a new completed run holding every cell of a complexities.json-style dict (e.g. merged shards)"""
+        run = self.start_run()
+        rows = list()
+        for spacetime_index,(filename,complexities) in enumerate(data_results.items()):
+            rule,ic,symmetry = SpacetimeDataset.parse_key(splitext(basename(filename))[0])
+            for metric_index,(metric_name,value) in enumerate(complexities.items()):
+                rows.append((run,spacetime_index,filename,rule,ic,symmetry,metric_index,metric_name,None if value is None else float(value)))
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT INTO complexities VALUES (?,?,?,?,?,?,?,?,?)",rows)
+        self.finish_run()
+        return run
+
+    def rows(self, run:Optional[int]=None, metric_name:Optional[str]=None) -> DataFrame:
+        """one row per cell of a run (the latest completed one by default), in the run's spacetime and metric order"""
+        run = self.latest_run() if run is None else run
+        assert run is not None, f"no completed run in {self.path}"
+        query = "SELECT * FROM complexities WHERE run = ?"
+        parameters = (run,)
+        if metric_name is not None:
+            query += " AND metric = ?"
+            parameters += (metric_name,)
+        with self.lock:
+            rows = self.connection.execute(query+" ORDER BY spacetime_index, metric_index, rowid",parameters).fetchall()
+        return DataFrame(rows,columns=list(self.COLUMNS)).astype(
+            dict(rule="Int64",ic="Int64")
+        ).drop_duplicates(subset=["filename","metric"],keep="last")
+
+    def column(self, metric_name:str, run:Optional[int]=None) -> Series:
+        """one metric's complexities indexed by filename"""
+        rows = self.rows(run=run,metric_name=metric_name)
+        return Series(rows["value"].to_numpy(dtype=float),index=rows["filename"].to_numpy(),name=metric_name)
+
+    def complexities(self, run:Optional[int]=None) -> DataFrame:
+        """(filename, metric) complexities, laid out as QualityEvaluations.load_complexities reads complexities.json"""
+        rows = self.rows(run=run)
+        complexities = rows.pivot(index="filename",columns="metric",values="value").astype(float)
+        complexities = complexities.loc[
+            rows["filename"].drop_duplicates().to_list(),
+            rows.sort_values("metric_index",kind="stable")["metric"].drop_duplicates().to_list()
+        ]
+        complexities.index.name = None
+        complexities.columns.name = None
+        return complexities
+
+    def export_json(self, filename:str, run:Optional[int]=None) -> None:
+        """a run as complexities.json"""
+        complexities = self.complexities(run=run)
+        with open(filename,"w") as results_file:
+            dump(dict(
+                (spacetime,dict(
+                    (metric_name,None if value != value else value)
+                    for metric_name,value in row.items()
+                ))
+                for spacetime,row in complexities.iterrows()
+            ), results_file, indent = 3)
+
+    def close(self) -> None:
+        self.connection.close()
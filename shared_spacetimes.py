@@ -0,0 +1,72 @@
+from collections import OrderedDict
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Tuple
+from numpy import ndarray, dtype, frombuffer
+
+Location = Tuple[str,int,Tuple[int,...],str]
+"""(shared memory name, byte offset, shape, dtype) of a spacetime"""
+
+ATTACHED:Dict[str,SharedMemory] = OrderedDict()
+"""shared memory blocks a worker process has attached to, by name (the most recent MAX_ATTACHED)"""
+MAX_ATTACHED = 256
+
+class SharedSpacetimes:
+    """
+    spacetimes copied once into a single multiprocessing.shared_memory block,
+    so worker processes read them in place from a small location tuple
+    instead of unpickling (or reloading) each array
+    """
+    def __init__(self, spacetimes:Dict[str,ndarray]) -> None:
+        offsets = dict()
+        n_bytes = 0
+        for key,spacetime_evolution in spacetimes.items():
+            offsets[key] = n_bytes
+            n_bytes += -(-spacetime_evolution.nbytes//8)*8
+        self.memory = SharedMemory(create=True,size=max(1,n_bytes))
+        self.locations = dict()
+        for key,spacetime_evolution in spacetimes.items():
+            self.locations[key] = (
+                self.memory.name,
+                offsets[key],
+                spacetime_evolution.shape,
+                spacetime_evolution.dtype.str
+            )
+            self.array(self.locations[key],memory=self.memory)[...] = spacetime_evolution
+
+    def __enter__(self) -> "SharedSpacetimes":
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """release the block (workers still attached keep reading it until they detach)"""
+        self.memory.close()
+        self.memory.unlink()
+
+    @staticmethod
+    def array(location:Location, memory:SharedMemory) -> ndarray:
+        _,offset,shape,dtype_str = location
+        element_type = dtype(dtype_str)
+        n_elements = 1
+        for length in shape:
+            n_elements *= length
+        return frombuffer(
+            memory.buf,dtype=element_type,count=n_elements,offset=offset
+        ).reshape(shape)
+
+    @staticmethod
+    def attach(location:Location) -> ndarray:
+        """
+        the spacetime at a location (in a worker process, attaching to each block
+        once and detaching from the least recently used beyond MAX_ATTACHED,
+        as a stream of spacetimes each has its own block)
+        """
+        name = location[0]
+        if name not in ATTACHED:
+            ATTACHED[name] = SharedMemory(name=name)
+            while len(ATTACHED) > MAX_ATTACHED:
+                _,memory = ATTACHED.popitem(last=False)
+                memory.close()
+        ATTACHED.move_to_end(name)
+        return SharedSpacetimes.array(location,memory=ATTACHED[name])
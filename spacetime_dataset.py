@@ -0,0 +1,98 @@
+from json import dump, load
+from os import makedirs
+from os.path import getsize
+from re import fullmatch
+from typing import Iterable, Iterator, List, Optional, Tuple
+from numpy import ndarray, memmap, packbits, unpackbits, save, uint8
+
+class SpacetimeDataset:
+    """
+    bit-packed container of binary spacetimes, memory-mapped and unpacked lazily:
+    {path}.bits holds the rows of every spacetime packed along the lattice axis (8 cells per byte)
+    {path}.json indexes each spacetime by key with its byte offset, shape, rule, ic and symmetry
+    """
+    def __init__(self, path:str) -> None:
+        self.path = path
+        with open(f"{path}.json") as index_file:
+            self.index = load(index_file)
+        self.bits = memmap(
+            f"{path}.bits",dtype=uint8,mode="r"
+        ) if getsize(f"{path}.bits") else None
+
+    def keys(self) -> List[str]:
+        return list(self.index)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __iter__(self) -> Iterator[Tuple[str,ndarray]]:
+        for key in self.index:
+            yield key,self[key]
+
+    def __getitem__(self, key:str) -> ndarray:
+        return self.unpack(entries=[self.index[key]])[0]
+
+    def batch(self, keys:List[str]) -> ndarray:
+        """(B,ω,T) stack of same-shaped spacetimes stored next to each other"""
+        entries = [self.index[key] for key in keys]
+        assert all(entry["shape"] == entries[0]["shape"] for entry in entries), "batched spacetimes must share a shape"
+        assert all(
+            entry["offset"] == previous["offset"]+previous["n_bytes"]
+            for previous,entry in zip(entries,entries[1:])
+        ), "batched spacetimes must be stored contiguously"
+        return self.unpack(entries=entries)
+
+    def batches(self, batch_size:int) -> Iterator[Tuple[List[str],ndarray]]:
+        """contiguous runs of up to batch_size same-shaped spacetimes"""
+        keys = list()
+        for key,entry in self.index.items():
+            if keys and (len(keys) == batch_size or entry["shape"] != self.index[keys[0]]["shape"]):
+                yield keys,self.batch(keys)
+                keys = list()
+            keys.append(key)
+        if keys:
+            yield keys,self.batch(keys)
+
+    def unpack(self, entries:List[dict]) -> ndarray:
+        rows,columns = entries[0]["shape"]
+        start = entries[0]["offset"]
+        stop = entries[-1]["offset"]+entries[-1]["n_bytes"]
+        packed = self.bits[start:stop].reshape((len(entries),rows,-1))
+        return unpackbits(packed,axis=-1,count=columns).astype(int)
+
+    def export_npy(self, path:str) -> None:
+        """write every spacetime as {path}/{key}.npy (the original dataset layout)"""
+        makedirs(path,exist_ok=True)
+        for key,spacetime_evolution in self:
+            with open(f"{path}/{key}.npy", 'wb') as spacetime_file:
+                save(spacetime_file, spacetime_evolution, allow_pickle=False)
+
+    @staticmethod
+    def write(path:str, spacetimes:Iterable[Tuple[str,ndarray]]) -> None:
+        index = dict()
+        offset = 0
+        with open(f"{path}.bits","wb") as bits_file:
+            for key,spacetime_evolution in spacetimes:
+                packed = packbits(spacetime_evolution.astype(uint8),axis=-1)
+                bits_file.write(packed.tobytes())
+                rule,ic,symmetry = SpacetimeDataset.parse_key(key)
+                index[key] = dict(
+                    offset=offset,
+                    n_bytes=packed.size,
+                    shape=list(spacetime_evolution.shape),
+                    rule=rule,
+                    ic=ic,
+                    symmetry=symmetry
+                )
+                offset += packed.size
+        with open(f"{path}.json","w") as index_file:
+            dump(index, index_file, indent = 3)
+
+    @staticmethod
+    def parse_key(key:str) -> Tuple[Optional[int],Optional[int],Optional[str]]:
+        """rule, initial condition and symmetry of a key such as rule110_ic8932_identity"""
+        match = fullmatch(r"rule(\d+)_ic(\d+)_(\w+)",key)
+        if match is None:
+            return None,None,None
+        rule,ic,symmetry = match.groups()
+        return int(rule),int(ic),symmetry
@@ -0,0 +1,93 @@
+from json import dumps
+from os import makedirs
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from numpy import ndarray
+
+from cellular_automata import ElementaryCellularAutomata
+from metrics import METRICS, LosslessFourierCompression
+from metrics.lossless_fourier_compression_metric.sliding_window import SlidingFourierSpectrum, SlidingFourierCompression
+
+class StreamingComplexity:
+    """
+    complexity as a time series over a long evolution consumed one row at a time:
+    every stride rows (once window rows have arrived) the last window rows are
+    measured with each metric, holding only the window (so memory is bounded by
+    the window, not the length of the run)
+
+    LosslessFourierCompression is measured on each window from scratch with
+    one of LosslessFourierCompression.SEARCHES (the default "exhaustive"
+    reproduces METRICS on every window, as does the faster "certified"), or
+    with search="warm" on the window's sliding 2D spectrum (see
+    SlidingFourierSpectrum) with the filter search warm-started from the
+    previous window's (see SlidingFourierCompression); the approximate
+    searches ("warm" and "bisect", which only find the exhaustive search's
+    filter when the loss curve is monotone) are reported under their own
+    name, e.g. LosslessFourierCompression_warm, and the other metrics are
+    measured on each window from scratch
+    """
+    APPROXIMATE_SEARCHES = ("warm","bisect")
+
+    def __init__(
+        self,
+        width:int,
+        window:int,
+        stride:int=1,
+        metric_names:Tuple[str,...]=tuple(METRICS),
+        quantisation_threshold:float=0.5,
+        search:str="exhaustive",
+        resync_interval:int=256
+    ) -> None:
+        assert window > 0 and stride > 0, "window and stride must be positive"
+        assert search == "warm" or search in LosslessFourierCompression.SEARCHES, f"unknown search '{search}'"
+        assert all(metric_name in METRICS for metric_name in metric_names), "metrics must be registered in METRICS"
+        self.window = window
+        self.stride = stride
+        self.metric_names = metric_names
+        self.θ = quantisation_threshold
+        self.search = search
+        self.fourier_name = f"LosslessFourierCompression_{search}" if search in StreamingComplexity.APPROXIMATE_SEARCHES else "LosslessFourierCompression"
+        self.spectrum = SlidingFourierSpectrum(width=width,window=window,resync_interval=resync_interval)
+        self.fourier = SlidingFourierCompression(quantisation_threshold=quantisation_threshold)
+
+    def push(self, row:ndarray) -> Optional[Dict[str,object]]:
+        """
+        consume the next row, returning the complexities of the window it
+        completes (with the index of the window's first row) on every stride-th window
+        """
+        self.spectrum.push(row)
+        start = self.spectrum.n_rows-self.window
+        if start < 0 or start%self.stride:
+            return None
+        spacetime_evolution = self.spectrum.spacetime().astype(int)
+        complexities = dict()
+        for metric_name in self.metric_names:
+            if metric_name != "LosslessFourierCompression":
+                complexities[metric_name] = float(METRICS[metric_name](spacetime_evolution))
+            elif self.search == "warm":
+                complexities[self.fourier_name] = self.fourier.complexity(
+                    s=spacetime_evolution,z=self.spectrum.spectrum()
+                )
+            else:
+                complexities[self.fourier_name] = float(LosslessFourierCompression(
+                    spacetime_evolution=spacetime_evolution,
+                    quantisation_threshold=self.θ,
+                    search=self.search
+                ).complexity)
+        return dict(start=start,complexities=complexities)
+
+    def stream(self, rows:Iterable[ndarray]) -> Iterator[Dict[str,object]]:
+        """the complexities of every stride-th window of the rows, as each one completes"""
+        for row in rows:
+            window = self.push(row)
+            if window is not None:
+                yield window
+
+if __name__ == "__main__":
+    makedirs("results", exist_ok=True)
+    rule,initial_condition,width = 110,8932,100
+    streaming_complexity = StreamingComplexity(width=width,window=100,stride=10,search="certified")
+    with open(f"results/streaming_rule{rule}_ic{initial_condition}.jsonl","w") as results_file:
+        for window in streaming_complexity.stream(
+            ElementaryCellularAutomata.rows(rule=rule,initial_condition=initial_condition,width=width,depth=100_000)
+        ):
+            results_file.write(dumps(window)+"\n")
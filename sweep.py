@@ -0,0 +1,230 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+from json import dumps, loads
+from os import makedirs
+from os.path import exists
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from numpy import ascontiguousarray
+
+from cellular_automata import ElementaryCellularAutomata
+from metrics import METRICS, SYMMETRY_INVARIANCES
+from metrics.symmetries import Symmetry, IDENTITY, apply_symmetry
+from results_store import ResultsStore
+
+Run = Tuple[int,int,int,int]
+"""(rule, initial condition, width, depth)"""
+
+Simulation = Tuple[int,List[Tuple[int,int,Symmetry]]]
+"""(representative rule, the (rule, initial condition, symmetry) runs its spacetime stands for)"""
+
+def measure_job(
+    simulations:List[Simulation],
+    initial_condition:int,
+    width:int,
+    depth:int,
+    transient_time:int,
+    metric_names:Tuple[str,...]
+) -> List[dict]:
+    """
+    evolve the representative rules together from one initial condition and measure
+    each run they stand for on its own spacetime, the representative's with the run's
+    symmetry applied (in a worker process): a metric invariant under that symmetry
+    (see SYMMETRY_INVARIANCES) is measured once on the representative's spacetime
+    """
+    spacetimes = ElementaryCellularAutomata.evolve(
+        rules=[representative for representative,_ in simulations],
+        initial_conditions=[initial_condition],
+        width=width,
+        depth=depth
+    )[:,0,transient_time:].astype(int)
+    records = list()
+    for (_,runs),spacetime_evolution in zip(simulations,spacetimes):
+        complexities = dict()
+        for rule,ic,g in runs:
+            measured = dict(
+                (metric_name,IDENTITY if g in SYMMETRY_INVARIANCES.get(metric_name,(IDENTITY,)) else g)
+                for metric_name in metric_names
+            )
+            for metric_name,h in measured.items():
+                if (metric_name,h) not in complexities:
+                    complexities[metric_name,h] = float(METRICS[metric_name](
+                        ascontiguousarray(apply_symmetry(spacetime_evolution,h))
+                    ))
+            records.append(dict(
+                rule=rule,
+                ic=ic,
+                width=width,
+                depth=depth,
+                complexities=dict(
+                    (metric_name,complexities[metric_name,h])
+                    for metric_name,h in measured.items()
+                )
+            ))
+    return records
+
+class Sweep:
+    """
+    grid of rules × initial conditions × lattice sizes, simulated per ECA
+    equivalence class: a mirrored or complemented rule's spacetime is the
+    mirrored or complemented spacetime of its class representative from
+    the mirrored or complemented initial condition, so each requested run
+    evolves its representative from that initial condition and is measured
+    on the spacetime mapped back, reusing only the metrics invariant under
+    that map
+
+    runs only share a simulation when they map to the same representative
+    and initial condition, which takes the initial conditions to be closed
+    under mirroring and complementing: with symmetric_initial_conditions,
+    the mirrored and complemented initial conditions of every requested one
+    (at each width) are swept too, so the 256 rules × 4 initial conditions
+    take one simulation per class and initial condition (88 × 4); without
+    it, an initial condition that is neither palindromic nor
+    self-complementary gives every rule its own simulation
+
+    jobs (one lattice size and simulated initial condition, every
+    representative rule evolved from it) run on a process pool largest
+    lattice first, and each job's results (one per requested run, with its
+    own rule and initial condition) are appended to {results_path}/sweep.jsonl
+    as soon as it completes (runs already in the file are skipped, so an
+    interrupted sweep resumes); once every job is done, the whole file is
+    appended to the results store {results_path}/sweep.sqlite as one
+    completed run (see ResultsStore)
+    """
+    def __init__(
+        self,
+        rules:Iterable[int]=range(256),
+        initial_conditions:Iterable[int]=(8932,),
+        sizes:Iterable[Tuple[int,int]]=((100,110),),
+        transient_time:int=10,
+        symmetric_initial_conditions:bool=False
+    ) -> None:
+        self.rules = list(rules)
+        self.initial_conditions = list(initial_conditions)
+        self.sizes = list(sizes)
+        self.transient_time = transient_time
+        self.symmetric_initial_conditions = symmetric_initial_conditions
+        self.representatives = dict(
+            (rule,ElementaryCellularAutomata.representative(rule))
+            for rule in self.rules
+        )
+        assert all(
+            transient_time < depth and 0 <= ic < 2**width
+            for ic,(width,depth) in product(self.initial_conditions,self.sizes)
+        ), "every initial condition must fit every lattice width, and every depth must exceed the transient time"
+
+    def width_initial_conditions(self, width:int) -> List[int]:
+        """the requested initial conditions and, when symmetric, their mirrored and complemented ones"""
+        if not self.symmetric_initial_conditions:
+            return self.initial_conditions
+        initial_conditions = dict()
+        for ic in self.initial_conditions:
+            mirrored = ElementaryCellularAutomata.mirror_initial_condition(ic,width)
+            for symmetric_ic in (
+                ic,
+                mirrored,
+                ElementaryCellularAutomata.complement_initial_condition(ic,width),
+                ElementaryCellularAutomata.complement_initial_condition(mirrored,width)
+            ):
+                initial_conditions.setdefault(symmetric_ic,None)
+        return list(initial_conditions)
+
+    def runs(self) -> List[Run]:
+        return [
+            (rule,ic,width,depth)
+            for width,depth in self.sizes
+            for ic,rule in product(self.width_initial_conditions(width),self.rules)
+        ]
+
+    def simulation(self, rule:int, ic:int, width:int) -> Tuple[int,int,Symmetry]:
+        """(representative rule, initial condition it evolves from, symmetry mapping its spacetime to the run's)"""
+        representative,mirrored,complemented = self.representatives[rule]
+        ic = ElementaryCellularAutomata.mirror_initial_condition(ic,width) if mirrored else ic
+        ic = ElementaryCellularAutomata.complement_initial_condition(ic,width) if complemented else ic
+        return representative,ic,(False,False,mirrored,complemented)
+
+    def jobs(self, completed:Set[Run]) -> List[Tuple[List[Simulation],int,int,int]]:
+        """(simulations still to run, initial condition they evolve from, width, depth), largest lattice first"""
+        jobs = dict()
+        for rule,ic,width,depth in self.runs():
+            if (rule,ic,width,depth) in completed:
+                continue
+            representative,simulated_ic,g = self.simulation(rule,ic,width)
+            simulations = jobs.setdefault((simulated_ic,width,depth),dict())
+            simulations.setdefault(representative,list()).append((rule,ic,g))
+        return sorted(
+            [
+                (list(simulations.items()),ic,width,depth)
+                for (ic,width,depth),simulations in jobs.items()
+            ],
+            key=lambda job:len(job[0])*job[2]*job[3],
+            reverse=True
+        )
+
+    @staticmethod
+    def records(results_filename:str) -> List[dict]:
+        """every complete line of a results file (a line cut short by an interrupted run is skipped)"""
+        if not exists(results_filename):
+            return list()
+        records = list()
+        with open(results_filename) as results_file:
+            for line in results_file:
+                try:
+                    records.append(loads(line))
+                except ValueError:
+                    continue
+        return records
+
+    @staticmethod
+    def completed(results_filename:str) -> Set[Run]:
+        return set(
+            (record["rule"],record["ic"],record["width"],record["depth"])
+            for record in Sweep.records(results_filename)
+        )
+
+    def run(
+        self,
+        results_path:str="results",
+        metric_names:Tuple[str,...]=tuple(METRICS),
+        n_processes:Optional[int]=None
+    ) -> None:
+        makedirs(results_path, exist_ok=True)
+        results_filename = f"{results_path}/sweep.jsonl"
+        jobs = self.jobs(completed=self.completed(results_filename))
+        n_simulations = sum(len(simulations) for simulations,*_ in jobs)
+        print(f"{len(self.runs())} runs, {n_simulations} simulations in {len(jobs)} jobs to do")
+        with ProcessPoolExecutor(max_workers=n_processes) as processes, open(results_filename,"a+") as results_file:
+            if results_file.tell():
+                results_file.seek(results_file.tell()-1)
+                if results_file.read(1) != "\n":
+                    results_file.write("\n")
+            futures = [
+                processes.submit(
+                    measure_job,simulations,ic,width,depth,self.transient_time,metric_names
+                )
+                for simulations,ic,width,depth in jobs
+            ]
+            for n_done,future in enumerate(as_completed(futures),start=1):
+                for record in future.result():
+                    results_file.write(dumps(record)+"\n")
+                results_file.flush()
+                print(f"{n_done}/{len(jobs)} jobs")
+        results_store = ResultsStore(f"{results_path}/sweep.sqlite")
+        results_store.append_results(Sweep.load(results_filename))
+        results_store.close()
+
+    @staticmethod
+    def load(results_filename:str) -> Dict[str,Dict[str,float]]:
+        """sweep results keyed by {width}x{depth}/rule{rule}_ic{ic}_identity (as the dataset's spacetimes, one directory per lattice size)"""
+        return dict(
+            (f"{record['width']}x{record['depth']}/rule{record['rule']}_ic{record['ic']}_identity",record["complexities"])
+            for record in Sweep.records(results_filename)
+        )
+
+if __name__ == "__main__":
+    Sweep(
+        rules=range(256),
+        initial_conditions=(8932,),
+        sizes=((100,110),),
+        transient_time=10,
+        symmetric_initial_conditions=True
+    ).run(results_path="results")